@@ -1 +0,0 @@
-from . import city_generator
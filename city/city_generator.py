@@ -11,14 +11,14 @@ from . import config
 from . import debug
 from . import generation
 from . import build_gen
+from . import city_store
 from . import drawing
+from . import simulation
+from . import tiles
+from . import stats
 import collections
 
 import numpy as np
-import pandas as pd
-
-from .survivor import Survivor
-from .zombie import Zombie
 
 
 class InputData:
@@ -63,46 +63,27 @@ def main():
 
     lots = []
 
-    city = generation.generate()
+    city = city_store.generate()
+    road_tiles = tiles.TileCache(city)
     city_labels = []
     for road in city.roads:
         city_labels.append((str(road.global_id),
                             road.point_at(0.5)))
 
-    road_population_densities = np.array([city.pop.at_line(r) for r in city.roads])
-    road_population_densities /= np.sum(road_population_densities)
-
-    survivors = []
-    for _ in range(0, config.INIT_SURVIVORS):
-        survivors.append(Survivor(city, road_population_densities=road_population_densities))
-    total_infected_count = 1
-    total_infection_duration = 0
-    total_perma_corpse_count = 0
-    for _ in range(0, config.INIT_INFECTED):
-        infected = Survivor(city)
-        infected.infect()
-        total_infection_duration += survivors.append(infected)
-
-    zombies = []
-    for _ in range(0, config.INIT_ZOMBIES):
-        zombies.append(Zombie(city, init_delay=1))
-        #infected = Survivor(city)
-        #infected.infect(incubation_time=1)
+    sim = simulation.create(city, config.ENTITY_ENGINE)
+    recorder = stats.StatsRecorder(raw_stats=stats.raw_stats_writer(config.ROAD_SEED))
 
-    prev_time = pygame.time.get_ticks()
+    # the simulation ticks at SIM_TICK_RATE (or flat out) and frames are drawn at up to RENDER_FPS
+    tick_interval = 1000 / config.SIM_TICK_RATE if config.SIM_TICK_RATE > 0 else 0
+    frame_interval = 1000 / config.RENDER_FPS
+    next_tick = next_frame = pygame.time.get_ticks()
+    eligible_count, _ = sim.eligible_count()
 
     running = True
     iteration = 0
-    last_gathered_iteration = 0
-    raw_stats = []
-    eligible_count_per_iteration = []
     while running:
-        if pygame.time.get_ticks() - prev_time < 16:
-            continue
-
         input_data.pos = pygame.mouse.get_pos()
         input_data.pressed = pygame.mouse.get_pressed()
-        prev_time = pygame.time.get_ticks()
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -117,12 +98,14 @@ def main():
                     city_labels = []
                     selection = None
                     path_data = pathing.PathData()
-                    city = generation.generate()
+                    city = city_store.generate()
+                    road_tiles = tiles.TileCache(city, lots)
                     for road in city.roads:
                         city_labels.append((str(road.global_id),
                                             road.point_at(0.5)))
                 if event.key == pygame.K_b:
                     lots = build_gen.gen_lots(city)
+                    road_tiles = tiles.TileCache(city, lots)
                 # Pathing
                 elif event.key == pygame.K_z:
                     path_data.start = road_near_point(input_data.pos,
@@ -164,26 +147,82 @@ def main():
                 input_data.drag_start = input_data.pos
                 input_data.drag_prev_pos = input_data.pos
 
-        # Drawing
-        screen_data.screen.fill((0, 0, 0))
-        if debug.SHOW_HEATMAP:
-            drawing.draw_popmap(50, survivors, zombies, screen_data)
-        if debug.SHOW_SECTORS:
-            drawing.draw_sectors(screen_data)
-
-        color = (125, 255, 50)
-        for poly in lots:
-            temp = []
-            for point in poly:
-                temp.append(drawing.world_to_screen(point, screen_data.pan, screen_data.zoom))
-            pygame.draw.polygon(screen_data.screen, color, temp)
-            color = (color[0], color[1] - 11, color[2] + 7)
-            if color[1] < 0:
-                color = (color[0], 255, color[2])
-            if color[2] > 255:
-                color = (color[0], color[1], 0)
-
-        # Draw roads
+        # run the ticks that are due; a due frame waits for them to catch up, but is not put off
+        # by more than MAX_FRAME_SKIP frames
+        now = pygame.time.get_ticks()
+        while now >= next_tick:
+            # gather entity stats
+            eligible_count, r0 = sim.eligible_count()
+            recorder.gather(iteration, sim, eligible_count)
+
+            # s, i, p, z, c
+            if not sim.has_survivors():
+                recorder.gather(iteration, sim, eligible_count, force=True)
+                recorder.write(config.ROAD_SEED)
+
+                print()
+                print(f'r0    : {r0}')
+                print()
+                """
+                print(f'Alpha : {sim.total_perma_corpse_count/iteration}')
+                print(f'Beta  : {sim.total_infected_count/iteration}')
+                print(f'Zeta  : {sim.total_infected_count/sim.total_infection_duration}')
+                print()
+                """
+                print(f'np.random check: {np.random.randint(0, 100)}')
+                print(f'random check   : {random.randint(0, 100)}')
+
+                close_simulation(sim)
+                return
+
+            # move zombies and survivors
+            sim.step()
+            iteration += 1
+            next_tick += tick_interval
+
+            now = pygame.time.get_ticks()
+            if now >= next_frame and (tick_interval == 0 or
+                                      now >= next_frame + config.MAX_FRAME_SKIP * frame_interval):
+                break
+        if now - next_tick > frame_interval:
+            # too far behind to catch up, so let the simulation run slow instead of piling up ticks
+            next_tick = now
+
+        if now >= next_frame:
+            draw_frame(screen_data, input_data, path_data, selection, city, city_labels, road_tiles, sim,
+                       eligible_count, iteration)
+            next_frame += frame_interval
+            if next_frame < now:
+                # the frame was late, so start counting again from here to keep under the cap
+                next_frame = now + frame_interval
+
+        # sleep until the next tick or frame is due instead of spinning
+        wait = min(next_tick, next_frame) - pygame.time.get_ticks()
+        if wait >= 1:
+            pygame.time.wait(int(wait))
+
+    close_simulation(sim)
+
+
+def close_simulation(sim):
+    """ Stops a partitioned simulation's worker processes """
+    if hasattr(sim, 'close'):
+        sim.close()
+
+
+def draw_frame(screen_data, input_data, path_data, selection, city, city_labels, road_tiles, sim, eligible_count,
+               iteration):
+    """ Draws the city, the entities and the debug overlays, then flips the display """
+    screen_data.screen.fill((0, 0, 0))
+    if debug.SHOW_HEATMAP:
+        drawing.draw_popmap(50, stats.counts_from_grid(sim.sector_grid(config.SECTOR_SIZE)), screen_data)
+    if debug.SHOW_SECTORS:
+        drawing.draw_sectors(screen_data)
+
+    # Draw lots and roads, from the tiles unless only some of the roads are to be shown
+    isolated = (debug.SHOW_ISOLATE_SECTOR and selection is not None) or debug.SHOW_MOUSE_SECTOR
+    if isolated or not road_tiles.draw(screen_data):
+        drawing.draw_lots(road_tiles.lots, road_tiles.lot_colors, screen_data)
         if debug.SHOW_ISOLATE_SECTOR and selection is not None:
             for sector in sectors.from_seg(selection.road):
                 drawing.draw_all_roads(city.sectors[sector], screen_data)
@@ -194,214 +233,36 @@ def main():
             if mouse_sec in city.sectors:
                 drawing.draw_all_roads(city.sectors[mouse_sec], screen_data)
         else:
-            tl_sect = sectors.containing_sector(
-                drawing.screen_to_world((0, 0),
-                                        screen_data.pan, screen_data.zoom))
-            br_sect = sectors.containing_sector(
-                drawing.screen_to_world(config.SCREEN_RES,
-                                        screen_data.pan, screen_data.zoom))
-            for x in range(tl_sect[0], br_sect[0] + 1):
-                for y in range(tl_sect[1], br_sect[1] + 1):
-                    if (x, y) in city.sectors:
-                        drawing.draw_all_roads(city.sectors[(x, y)],
-                                               screen_data)
-        if 0:
-            drawing.draw_roads_selected(selection, screen_data)
-            drawing.draw_roads_path(path_data, screen_data)
-
-        # gather entity stats
-        eligible_count, r0 = get_eligible_count_for_iteration(zombies)
-        if iteration % 12 == 0:  # assume one minute per iteration
-            last_gathered_iteration = iteration
-            rs = get_raw_stats_for_iteration(iteration, survivors, zombies)
-            raw_stats.extend(rs)
-            eligible_count_per_iteration.append(eligible_count)
-            # sector_eligible_sets_per_iteration.append((iteration, es))
-
-        # s, i, p, z, c
-        any_survivors = any(survivors)  # any([True for s in survivors if not s.is_infected])
-        if not any_survivors:  # iteration == 62:
-            if iteration > last_gathered_iteration:
-                rs = get_raw_stats_for_iteration(iteration, survivors, zombies)
-                raw_stats.extend(rs)
-                eligible_count_per_iteration.append(eligible_count)
-                # sector_eligible_sets_per_iteration.append((iteration, es))
-            raw_stats_df = pd.DataFrame(data=raw_stats)
-            # sector_stats_df = raw_stats_df.groupby(['iteration', 'sector_x', 'sector_y']).aggregate(np.sum)
-
-            summary_columns = ['iteration', 'survivors', 'infected', 'panicked', 'zombies', 'corpses']
-            summary_stats_df = raw_stats_df[summary_columns].groupby(['iteration']).aggregate(np.sum)
-            # calculate summary eligibles
-            """
-            eligible_counts = []
-            for i, ses in sector_eligible_sets_per_iteration:
-                city_set = set()
-                for s in ses.values():
-                    city_set.update(s)
-                eligible_counts.append(len(city_set))
-            """
-            summary_stats_df['eligible'] = eligible_count_per_iteration
-
-            raw_stats_df.to_pickle(f'data/raw_stats_{config.ROAD_SEED}.pk')
-            raw_stats_df.to_csv(f'data/raw_stats_{config.ROAD_SEED}.csv')
-
-            # sector_stats_df.to_pickle(f'data/sector_stats_{config.ROAD_SEED}.pk')
-            # sector_stats_df.to_csv(f'data/sector_stats_{config.ROAD_SEED}.csv')
-
-            summary_stats_df.to_pickle(f'data/summary_stats_{config.ROAD_SEED}.pk')
-            summary_stats_df.to_csv(f'data/summary_stats_{config.ROAD_SEED}.csv')
-
-            print()
-            print(f'r0    : {r0}')
-            print()
-            """
-            print(f'Alpha : {total_perma_corpse_count/iteration}')
-            print(f'Beta  : {total_infected_count/iteration}')
-            print(f'Zeta  : {total_infected_count/total_infection_duration}')
-            print()
-            """
-            print(f'np.random check: {np.random.randint(0, 100)}')
-            print(f'random check   : {random.randint(0, 100)}')
-
-            return
-
-        # move and draw zombies
-        for zombie in zombies:
-            zombie.move()
-            zombie.draw(screen_data)
-
-        # move and draw survivors
-        for survivor in survivors:
-            survivor.move()
-            survivor.draw(screen_data)
-
-        # check for new zombies and just infected
-        for survivor in list(survivors):
-            if not survivor.is_dead:
-                if survivor.just_infected:
-                    survivor.just_infected = False
-                    total_infection_duration += survivor.incubation_time_remaining
-                    total_infected_count += 1
-                continue
-            zombie = Zombie(city, survivor.road, survivor.x, survivor.y)
-            zombie.id = survivor.id
-            is_destroyed = random.random() > config.ZOMBIE_RAISE_CHANCE
-            if is_destroyed:
-                zombie.destroy()
-            zombies.append(zombie)
-            survivors.remove(survivor)
-
-        for zombie in zombies:
-            if zombie.just_destroyed:
-                total_perma_corpse_count += 1
-                zombie.just_destroyed = False
-                # print(total_perma_corpse_count)
-
-        # show info
-        if debug.SHOW_INFO:
-            debug_labels = debug.labels(screen_data, input_data,
-                                        path_data, selection, city, survivors, zombies, eligible_count, iteration)
-
-            for x in range(len(debug_labels[0])):
-                label_pos = (10, 10 + x * 15)
-                drawing.draw_label_screen((debug_labels[0][x], label_pos),
-                                          screen_data, 1)
-
-            for x in range(len(debug_labels[1])):
-                label_pos = (config.SCREEN_RES[0] - 10, 10 + x * 15)
-                drawing.draw_label_screen((debug_labels[1][x], label_pos),
-                                          screen_data, -1)
-
-        if debug.SHOW_ROAD_ORDER:
-            for label in city_labels:
-                drawing.draw_label_world(label, screen_data, 1)
-
-        pygame.display.flip()
-        iteration += 1
-
-
-def get_raw_stats_for_iteration(iteration, survivors, zombies):
-    entity_counts_by_sector = get_entity_sector_counts(survivors, zombies)
-    raw_stats = []
-    for sector in entity_counts_by_sector.keys():
-        s, i, p, z, c = entity_counts_by_sector[sector]
-        raw_stats.append({
-            'iteration': iteration,
-            'sector_x': sector[0],
-            'sector_y': sector[1],
-            'survivors': s,
-            'infected': i,
-            'panicked': p,
-            'zombies': z,
-            'corpses': c,
-        })
-    return raw_stats
-
-
-def get_eligible_count_for_iteration(zombies):
-    eligible = set()
-    r0 = 0
-    for z in zombies:
-        eligible.update([e.id for e in z.nearby_entities if (isinstance(e, Survivor) and
-                                                             not e.is_dead and
-                                                             not e.is_infected)])
-        r0 += z.infected_count
-    r0 /= len(zombies)
-
-    return len(eligible), r0
-
-
-def get_entity_sector_counts(survivors, zombies):
-    sector_counts = {}
-    """
-    survivor_count = sum([1 for s in survivors if not s.is_infected])
-    infected_count = sum([1 for s in survivors if s.is_infected])
-    panicked_count = sum([1 for s in survivors if s.is_panicked])
-    corpse_count = sum([1 for z in zombies if z.is_corpse()])
-    zombie_count = sum([1 for z in zombies if not z.is_corpse()])
-
-    """
-    # sector_eligible_sets = {}
-    # process survivors
-    for survivor in survivors:
-        sector = sectors.containing_sector((survivor.x, survivor.y))
-        if sector not in sector_counts.keys():
-            sector_counts[sector] = (0, 0, 0, 0, 0)
-            # sector_eligible_sets[sector] = set()
-        s, i, p, z, c = sector_counts[sector]
-        s += 1
-        if survivor.is_infected:
-            i += 1
-        if survivor.is_panicked:
-            p += 1
-        sector_counts[sector] = s, i, p, z, c
-
-    # process zombies
-    for zombie in zombies:
-        sector = sectors.containing_sector((zombie.x, zombie.y))
-        if sector not in sector_counts.keys():
-            sector_counts[sector] = (0, 0, 0, 0, 0)
-            # sector_eligible_sets[sector] = set()
-        s, i, p, z, c = sector_counts[sector]
-        if zombie.is_destroyed:
-            c += 1
-        else:
-            z += 1
-        """
-        sector_eligible_sets[sector].update([e.id for e in zombie.nearby_entities if (isinstance(e, Survivor) and
-                                                                                      not e.is_dead and
-                                                                                      not e.is_infected)])
-        """
-        sector_counts[sector] = s, i, p, z, c
-
-    # process eligibles
-    """
-    for sector in sector_counts.keys():
-        s, i, p, z, c, e = sector_counts[sector]
-        e = len(sector_eligible_sets[sector])
-        sector_counts[sector] = s, i, p, z, c, e
-    """
-    return sector_counts  # , sector_eligible_sets
+            for sector in drawing.visible_sectors(screen_data):
+                if sector in city.sectors:
+                    drawing.draw_all_roads(city.sectors[sector], screen_data)
+    if 0:
+        drawing.draw_roads_selected(selection, screen_data)
+        drawing.draw_roads_path(path_data, screen_data)
+
+    sim.draw(screen_data)
+
+    # show info
+    if debug.SHOW_INFO:
+        debug_labels = debug.labels(screen_data, input_data,
+                                    path_data, selection, city, sim.population(), eligible_count,
+                                    iteration)
+
+        for x in range(len(debug_labels[0])):
+            label_pos = (10, 10 + x * 15)
+            drawing.draw_label_screen((debug_labels[0][x], label_pos),
+                                      screen_data, 1)
+
+        for x in range(len(debug_labels[1])):
+            label_pos = (config.SCREEN_RES[0] - 10, 10 + x * 15)
+            drawing.draw_label_screen((debug_labels[1][x], label_pos),
+                                      screen_data, -1)
+
+    if debug.SHOW_ROAD_ORDER:
+        for label in city_labels:
+            drawing.draw_label_world(label, screen_data, 1)
+
+    pygame.display.flip()
 
 
 def handle_keys_debug(key):
@@ -0,0 +1,154 @@
+"""
+Generated cities as binary files, and an on-disk cache of them so that a city is only
+generated once for a given seed and generation config.
+
+    city = city_store.generate(200972)  # generated, then loaded from the cache next time
+
+    city_store.publish_network('network.bin', city)  # in the parent process
+    network = city_store.SharedNetwork('network.bin')  # in each worker
+
+A city file uses the snapshot layout (see snapshot.py): the road end points as coordinate
+arrays, the links as CSR adjacency, and the state of the random and np.random generators
+generation.generate leaves behind, so that what runs after a load draws the same numbers as
+it would after generating.
+
+The array engines need no more of a city than its Network and spawn densities, which
+publish_network writes to a file for SharedNetwork to map read-only. Every process mapping
+it shares the same pages of the page cache, so many workers cost one copy of the roads.
+"""
+import hashlib
+import json
+import os
+import random
+
+import numpy as np
+
+from . import config
+from . import generation
+from . import simulation
+from . import snapshot
+
+from .network import Network
+from .rng import RandomStreams
+
+# bump when the file contents change, to leave the cached files of older versions unused
+VERSION = 1
+
+# every config value generation.generate depends on; any change makes a new cache key
+GENERATION_CONFIG = ('MAX_SEGS', 'HIGHWAY_LENGTH', 'STREET_LENGTH', 'MIN_DIST_EDGE_CROSS', 'MIN_DIST_EDGE_CONTAINED',
+                     'SECTOR_SIZE', 'HIGHWAY_BRANCH_POP', 'HIGHWAY_BRANCH_CHANCE', 'STREET_BRANCH_POP',
+                     'STREET_BRANCH_CHANCE', 'STREET_EXTEND_POP', 'SNAP_VERTEX_RADIUS', 'SNAP_EXTEND_RADIUS',
+                     'MIN_ANGLE_DIFF', 'HIGHWAY_MAX_ANGLE_DEV', 'BRANCH_MAX_ANGLE_DEV')
+
+
+def generate(seed: int = None, cache_dir: str = None) -> generation.City:
+    """
+    Same as generation.generate, but loads the city from the cache if it has been generated
+    before, and caches it if not
+    :param seed: Road seed, config.ROAD_SEED by default. Cities from a random seed (a
+    ROAD_SEED of 0) are not cached.
+    :param cache_dir: Where the cached cities are kept, config.CITY_CACHE_DIR by default; None
+    there turns the cache off
+    """
+    seed = config.ROAD_SEED if seed is None else seed
+    cache_dir = config.CITY_CACHE_DIR if cache_dir is None else cache_dir
+    if not seed or not cache_dir:
+        return generation.generate(seed or None)
+
+    path = cache_path(seed, cache_dir)
+    if os.path.exists(path):
+        try:
+            return load(path)
+        except (OSError, ValueError, KeyError) as error:
+            print(f"Regenerating the city, the cached copy is unreadable: {error}")
+
+    city = generation.generate(seed)
+    os.makedirs(cache_dir, exist_ok=True)
+    # written under a temporary name first so that a process loading it never sees half a file
+    partial_path = f'{path}.{os.getpid()}.partial'
+    save(partial_path, city, seed)
+    os.replace(partial_path, path)
+    return city
+
+
+def cache_key(seed: int) -> str:
+    """ A hash of the seed and every value in GENERATION_CONFIG """
+    values = [VERSION, seed] + [getattr(config, name) for name in GENERATION_CONFIG]
+    return hashlib.sha256(json.dumps(values).encode()).hexdigest()[:16]
+
+
+def cache_path(seed: int, cache_dir: str = None) -> str:
+    cache_dir = config.CITY_CACHE_DIR if cache_dir is None else cache_dir
+    return os.path.join(cache_dir, f'city_{seed}_{cache_key(seed)}.bin')
+
+
+def save(path: str, city: generation.City, seed: int):
+    """
+    Writes a city straight after generation.generate has made it
+    :param seed: The seed it was generated from
+    """
+    arrays = {}
+    header = {'kind': 'city', 'version': VERSION, 'seed': seed, 'key': cache_key(seed),
+              'city': snapshot.city_state(city, arrays), 'random': random.getstate()}
+    _, arrays['np_random.key'], position, has_gauss, cached_gaussian = np.random.get_state()
+    header['np_random'] = {'pos': position, 'has_gauss': has_gauss, 'cached_gaussian': cached_gaussian}
+    snapshot.write(path, header, arrays)
+
+
+def load(path: str) -> generation.City:
+    """
+    Reads a city written by save, leaving the random and np.random generators as
+    generation.generate would have
+    """
+    header, arrays = snapshot.read(path)
+    if header.get('kind') != 'city' or header.get('version') != VERSION:
+        raise ValueError(f'{path} is not a version {VERSION} city file')
+    print("Loading {} segments with seed: {}".format(len(arrays['road.start']), header['seed']))
+
+    city = snapshot.restore_city(header['city'], arrays)
+    version, state, gauss_next = header['random']
+    random.setstate((version, tuple(state), gauss_next))
+    np_random = header['np_random']
+    np.random.set_state(('MT19937', np.array(arrays['np_random.key']), np_random['pos'], np_random['has_gauss'],
+                         np_random['cached_gaussian']))
+    return city
+
+
+def publish_network(path: str, city: generation.City):
+    """
+    Writes the road network and spawn densities of a city for SharedNetwork, straight after
+    generate has made or loaded it
+    """
+    network = Network.from_roads(city.roads)
+    arrays = {}
+    snapshot.network_arrays(network, arrays)
+    arrays['road.length'] = network.length
+    arrays['road.unit'] = network.unit
+    arrays['road.densities'] = simulation.road_population_densities(city)
+    # the seed a run on the city would draw its streams from, leaving np.random as it was
+    np_random = np.random.get_state()
+    default_seed = RandomStreams().seed
+    np.random.set_state(np_random)
+    snapshot.write(path, {'kind': 'network', 'version': VERSION, 'default_seed': default_seed}, arrays)
+
+
+class SharedNetwork(Network):
+    """
+    The Network written by publish_network, its arrays read-only maps of the file. Pickles as
+    the path alone, so a process it is sent to maps the file rather than receiving a copy.
+    """
+
+    def __init__(self, path: str):
+        header, arrays = snapshot.read(path, mode='r')
+        if header.get('kind') != 'network' or header.get('version') != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} network file')
+        super().__init__(arrays['road.start'], arrays['road.end'], arrays['road.link_ptr'], arrays['road.link_road'],
+                         arrays['road.link_enter_start'], arrays['road.length'], arrays['road.unit'])
+        self.path = path
+        # the probability of each road being picked for a survivor, see simulation.road_population_densities
+        self.densities = arrays['road.densities']
+        # the seed RandomStreams() draws right after generating the city, see publish_network
+        self.default_seed = header['default_seed']
+
+    def __reduce__(self):
+        return SharedNetwork, (self.path,)
@@ -0,0 +1,135 @@
+"""
+An append-only columnar table on disk: a directory holding a schema.json and one raw
+binary file per column, so that a table can be written a chunk at a time while a run is
+going and read back as memory maps without parsing anything.
+"""
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+from typing import Dict, List, Sequence, Tuple
+
+SCHEMA_FILE = 'schema.json'
+
+# rows buffered per column before a chunk is handed to the writer thread
+CHUNK_ROWS = 65536
+# chunks that can be waiting to be written before append blocks
+QUEUED_CHUNKS = 2
+
+
+class ColumnWriter:
+    """
+    Buffers rows in preallocated arrays, one per column, and appends each full chunk to the
+    column files from a background thread. Everything up to the last full chunk is on disk
+    even if the process is killed; close() writes the rest.
+    """
+
+    def __init__(self, directory: str, columns: Sequence[Tuple[str, str]], chunk_rows: int = CHUNK_ROWS):
+        """
+        Starts a new table, replacing any table already in the directory
+        :param columns: (name, numpy dtype) for each column
+        """
+        self.directory = directory
+        self.columns = [(name, np.dtype(dtype)) for name, dtype in columns]
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, SCHEMA_FILE), 'w') as schema_file:
+            json.dump([[name, dtype.str] for name, dtype in self.columns], schema_file)
+        self.files = [open(column_path(directory, name), 'wb') for name, _ in self.columns]
+
+        # the chunk being filled, plus spares for the writer thread to hand back once written
+        self.free = queue.Queue()
+        for _ in range(QUEUED_CHUNKS):
+            self.free.put(self._new_chunk())
+        self.chunk = self._new_chunk()
+        self.filled = 0
+        self.full = queue.Queue(QUEUED_CHUNKS)
+        self.error = None
+        self.thread = threading.Thread(target=self._write_chunks, daemon=True)
+        self.thread.start()
+
+    def _new_chunk(self) -> List[np.ndarray]:
+        return [np.empty(self.chunk_rows, dtype=dtype) for _, dtype in self.columns]
+
+    def append(self, *values: np.ndarray):
+        """
+        Appends rows
+        :param values: An array per column, in column order, all the same length
+        """
+        count = len(values[0])
+        done = 0
+        while done < count:
+            take = min(count - done, self.chunk_rows - self.filled)
+            for buffer, value in zip(self.chunk, values):
+                buffer[self.filled:self.filled + take] = value[done:done + take]
+            self.filled += take
+            done += take
+            if self.filled == self.chunk_rows:
+                self._hand_off()
+        self.rows += count
+
+    def _hand_off(self):
+        if self.error is not None:
+            raise self.error
+        self.full.put((self.chunk, self.filled))
+        self.chunk = self.free.get()
+        self.filled = 0
+
+    def _write_chunks(self):
+        while True:
+            chunk, filled = self.full.get()
+            if chunk is None:
+                return
+            try:
+                if self.error is None:
+                    for file, buffer in zip(self.files, chunk):
+                        buffer[:filled].tofile(file)
+                        file.flush()
+            except Exception as error:
+                # raised on the main thread by the next hand off or close
+                self.error = error
+            self.free.put(chunk)
+
+    def close(self):
+        """ Writes the partly filled chunk and waits for the writer thread to finish """
+        if self.thread is None:
+            return
+        if self.filled:
+            self._hand_off()
+        self.full.put((None, 0))
+        self.thread.join()
+        self.thread = None
+        for file in self.files:
+            file.close()
+        if self.error is not None:
+            raise self.error
+
+
+def column_path(directory: str, name: str) -> str:
+    return os.path.join(directory, name + '.bin')
+
+
+def read_columns(directory: str, mmap: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Opens a table written by ColumnWriter
+    :param mmap: Map the column files read-only rather than loading them into memory
+    :return: An array per column, in column order. A table cut short mid-write is read up to
+    the last row every column has.
+    """
+    with open(os.path.join(directory, SCHEMA_FILE)) as schema_file:
+        columns = [(name, np.dtype(dtype)) for name, dtype in json.load(schema_file)]
+    rows = min((os.path.getsize(column_path(directory, name)) // dtype.itemsize for name, dtype in columns),
+               default=0)
+
+    table = {}
+    for name, dtype in columns:
+        if mmap and rows:
+            table[name] = np.memmap(column_path(directory, name), dtype=dtype, mode='r', shape=(rows,))
+        else:
+            table[name] = np.fromfile(column_path(directory, name), dtype=dtype, count=rows)
+    return table
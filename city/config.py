@@ -1,5 +1,7 @@
 ROAD_SEED = 200972
 MAX_SEGS = 1000
+# generated cities are kept here and loaded instead of regenerated (see city_store.py), None to turn this off
+CITY_CACHE_DIR = 'data/cities'
 SCREEN_RES = (1200, 950)
 HIGHWAY_LENGTH = 400
 STREET_LENGTH = 300
@@ -10,6 +12,8 @@ MIN_DIST_EDGE_CROSS = 350
 MIN_DIST_EDGE_CONTAINED = 50
 
 SECTOR_SIZE = 550
+# side of the grid cells the stats count entities in; finer or coarser than the sectors is fine
+STATS_CELL_SIZE = SECTOR_SIZE
 
 HIGHWAY_BRANCH_POP = 0.1
 HIGHWAY_BRANCH_CHANCE = 0.1
@@ -37,6 +41,26 @@ ZOOM_GRANULARITY = 30
 # zombie sim additions
 ENTITY_SIZE = 3
 
+# 'objects' for the Survivor/Zombie classes, 'arrays' for the vectorized swarm,
+# 'partitioned' for the swarm split over PARTITION_WORKERS processes (0 for one per CPU).
+# Each engine repeats its run for a seed, and 'partitioned' gives the same run as 'arrays' whatever
+# the worker count, see PartitionedSwarm
+ENTITY_ENGINE = 'objects'
+PARTITION_WORKERS = 0
+# a trajectory recording (see trajectory.py) keeps every this many ticks
+TRAJECTORY_INTERVAL = 1
+
+# simulation ticks per second in the interactive app (0 for as fast as possible), the cap on
+# frames drawn per second, and how many frames in a row may be skipped to let the ticks catch up
+SIM_TICK_RATE = 60
+RENDER_FPS = 60
+MAX_FRAME_SKIP = 5
+
+# the roads and lots are drawn once per sector and zoom step into tiles of up to TILE_MAX_SIZE
+# pixels a side (closer in, they are drawn straight to the screen), keeping TILE_CACHE_BYTES of them
+TILE_MAX_SIZE = 1024
+TILE_CACHE_BYTES = 256 * 2 ** 20
+
 INIT_ZOMBIES = 1
 INIT_SURVIVORS = 4000
 INIT_INFECTED = 0
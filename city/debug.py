@@ -12,7 +12,7 @@ class RoadViews(enum.Enum):
     Branches = enum.auto()
 
 
-def labels(screen_data, input_data, path_data, selection, city, survivors, zombies, eligible_count, iteration):
+def labels(screen_data, input_data, path_data, selection, city, counts, eligible_count, iteration):
     mouse_world_pos = drawing.screen_to_world(input_data.pos, screen_data.pan, screen_data.zoom)
 
     debug_labels_left = []
@@ -28,24 +28,17 @@ def labels(screen_data, input_data, path_data, selection, city, survivors, zombi
     debug_labels_left.append(f"Pan: {px:.2f}, {py:.2f}")
     debug_labels_left.append(f"Zoom: {screen_data.zoom:.2f}")
 
-    survivor_count = len(survivors)  # sum([1 for s in survivors if not s.is_infected])
-    infected_count = sum([1 for s in survivors if s.is_infected])
-    panicked_count = sum([1 for s in survivors if s.is_panicked])
-    corpse_count = sum([1 for z in zombies if z.is_destroyed])
-    pending_zombie_count = sum([1 for z in zombies if z.is_corpse()]) - corpse_count
-    zombie_count = sum([1 for z in zombies if not z.is_corpse()])
-
     debug_labels_left.append("")
     debug_labels_left.append("")
     debug_labels_left.append(f"Iteration: {iteration}")
     debug_labels_left.append("")
-    debug_labels_left.append(f"Survivors: {survivor_count}")
+    debug_labels_left.append(f"Survivors: {counts['survivors']}")
     debug_labels_left.append(f"  Eligible: {eligible_count}")
-    debug_labels_left.append(f"  Infected: {infected_count}")
-    debug_labels_left.append(f"  Panicked: {panicked_count}")
-    debug_labels_left.append(f"Corpses: {corpse_count}")
-    debug_labels_left.append(f"Pre-Z  : {pending_zombie_count}")
-    debug_labels_left.append(f"Zombies: {zombie_count}")
+    debug_labels_left.append(f"  Infected: {counts['infected']}")
+    debug_labels_left.append(f"  Panicked: {counts['panicked']}")
+    debug_labels_left.append(f"Corpses: {counts['corpses']}")
+    debug_labels_left.append(f"Pre-Z  : {counts['rising']}")
+    debug_labels_left.append(f"Zombies: {counts['zombies']}")
 
 
     """
@@ -8,6 +8,8 @@ from . import population
 from . import vectors
 from . import generation
 from . import roads
+from . import trajectory
+import numpy as np
 from typing import Tuple, List
 
 
@@ -22,6 +24,11 @@ class ScreenData:
     def _zoom_at(step):
         return math.pow((step / config.ZOOM_GRANULARITY) + 1, 2)
 
+    @property
+    def zoom_step(self) -> int:
+        """ The number of zoom_in/zoom_out steps that give the current zoom """
+        return self._zoom_increment
+
     def zoom_in(self, center):
         self._zoom_change(1, center)
 
@@ -92,6 +99,25 @@ def draw_all_roads(all_roads: List[roads.Segment], data: ScreenData):
         draw_road(road, color, width, data)
 
 
+def lot_colors(count: int) -> List[Tuple[int, int, int]]:
+    """ Gets the colours the lots from build_gen.gen_lots are drawn in, cycling through greens and blues """
+    colors = []
+    color = (125, 255, 50)
+    for _ in range(count):
+        colors.append(color)
+        color = (color[0], color[1] - 11, color[2] + 7)
+        if color[1] < 0:
+            color = (color[0], 255, color[2])
+        if color[2] > 255:
+            color = (color[0], color[1], 0)
+    return colors
+
+
+def draw_lots(lots: List[List[Tuple[float, float]]], colors: List[Tuple[int, int, int]], data: ScreenData):
+    for poly, color in zip(lots, colors):
+        pygame.draw.polygon(data.screen, color, [world_to_screen(point, data.pan, data.zoom) for point in poly])
+
+
 def draw_roads_selected(selection: 'debug.Selection', data: ScreenData):
     if selection is not None:
         draw_road(selection[0], (255, 255, 0), config.ROAD_WIDTH_SELECTION, data)
@@ -131,12 +157,65 @@ def draw_label_world(label, data, justify):
     draw_label_screen((label[0], label_pos), data, justify)
 
 
+def visible_sectors(data: ScreenData) -> List[Tuple[int, int]]:
+    """ Gets the sectors that are at least partly on screen """
+    tl_sect = sectors.containing_sector(screen_to_world((0, 0), data.pan, data.zoom))
+    br_sect = sectors.containing_sector(screen_to_world(config.SCREEN_RES, data.pan, data.zoom))
+    return [(x, y) for x in range(tl_sect[0], br_sect[0] + 1) for y in range(tl_sect[1], br_sect[1] + 1)]
+
+
+# one pre-rendered circle per entity colour, see entity_sprite
+_entity_sprites = {}
+
+
+def entity_sprite(color: Tuple[int, int, int]) -> pygame.Surface:
+    """ Gets an entity's circle in the given colour, drawn once and then reused for blitting """
+    sprite = _entity_sprites.get(color)
+    if sprite is None:
+        size = 2 * config.ENTITY_SIZE + 1
+        sprite = pygame.Surface((size, size))
+        sprite.set_colorkey((0, 0, 0))
+        pygame.draw.circle(sprite, color, (config.ENTITY_SIZE, config.ENTITY_SIZE), config.ENTITY_SIZE)
+        _entity_sprites[color] = sprite
+    return sprite
+
+
+def draw_entities(city: generation.City, data: ScreenData):
+    """
+    Draws the entities on the roads of the visible sectors, zombies below survivors, with one
+    batch of sprite blits rather than a draw call per entity
+    """
+    visible_roads = dict.fromkeys(road for sector in visible_sectors(data) for road in city.sectors.get(sector, ()))
+    (pan_x, pan_y), zoom, r = data.pan, data.zoom, config.ENTITY_SIZE
+    width, height = config.SCREEN_RES
+    layers = ([], [])
+    for road in visible_roads:
+        for entity in road.entities:
+            color = entity.color()
+            if color is None:
+                continue
+            x, y = entity.position()
+            x = x * zoom + pan_x - r
+            y = y * zoom + pan_y - r
+            if -2 * r <= x <= width and -2 * r <= y <= height:
+                # zombies (is_dead) go in the first layer, so survivors are drawn over them
+                layers[not entity.is_dead].append((entity_sprite(color), (x, y)))
+    data.screen.blits(layers[0] + layers[1], doreturn=False)
+
+
+def zombie_color(is_corpse: bool, is_destroyed: bool) -> Tuple[int, int, int]:
+    if is_destroyed:
+        return 255, 255, 255
+    return (0, 128, 255) if is_corpse else (0, 192, 0)
+
+
 def draw_zombie(x, y, data: ScreenData):
-    pygame.draw.circle(data.screen, (0, 192, 0), world_to_screen((x, y), data.pan, data.zoom), config.ENTITY_SIZE)
+    pygame.draw.circle(data.screen, zombie_color(False, False), world_to_screen((x, y), data.pan, data.zoom),
+                       config.ENTITY_SIZE)
 
 
 def draw_corpse(x, y, data: ScreenData, is_destroyed):
-    color = (255, 255, 255) if is_destroyed else (0, 128, 255)
+    color = zombie_color(True, is_destroyed)
     pygame.draw.circle(data.screen, color, world_to_screen((x, y), data.pan, data.zoom), config.ENTITY_SIZE)
 
 
@@ -146,14 +225,48 @@ def lerp_(v1, v2, f):
     return int(round(v1 + (v2 - v1) * f))
 
 
-def draw_survivor(x, y, data: ScreenData, incubating, speed_factor=0):
+def survivor_color(incubating, speed_factor=0) -> Tuple[int, int, int]:
     r1, g1, b1 = (192, 192, 0) if incubating else (160, 96, 160)
     r2, g2, b2 = (255, 255, 0) if incubating else (255, 0, 255)
 
-    color = (max(0, min(lerp_(r1, r2, speed_factor), 255)),
-             max(0, min(lerp_(g1, g2, speed_factor), 255)),
-             max(0, min(lerp_(b1, b2, speed_factor), 255)))
+    return (max(0, min(lerp_(r1, r2, speed_factor), 255)),
+            max(0, min(lerp_(g1, g2, speed_factor), 255)),
+            max(0, min(lerp_(b1, b2, speed_factor), 255)))
+
+
+def state_color(state: int) -> Tuple[int, int, int]:
+    """ The colour an entity with a packed state is drawn in, matching Survivor.color and Zombie.color """
+    phase, is_infected, _, speed_factor = trajectory.unpack_states(np.uint8(state))
+    if phase == trajectory.SURVIVOR:
+        return survivor_color(bool(is_infected), float(speed_factor))
+    return zombie_color(phase != trajectory.ZOMBIE, phase == trajectory.DESTROYED)
+
+
+def draw_states(x: np.ndarray, y: np.ndarray, state: np.ndarray, data: ScreenData):
+    """
+    Draws entities from their world coordinates and packed states (see trajectory.pack_states),
+    zombies below survivors. Entities in the same state on the same pixel are drawn once, which
+    is most of them zoomed out.
+    """
+    (pan_x, pan_y), zoom, r = data.pan, data.zoom, config.ENTITY_SIZE
+    width, height = config.SCREEN_RES
+    # pixel coordinates of the sprites' corners, offset to be non-negative on screen
+    x = np.floor(x * zoom + pan_x).astype(np.int64) + r
+    y = np.floor(y * zoom + pan_y).astype(np.int64) + r
+    stride = width + 2 * r + 1
+    on_screen = (x >= 0) & (x < stride) & (y >= 0) & (y <= height + 2 * r)
+    keys = np.unique(((y[on_screen] * stride + x[on_screen]) << 8) | state[on_screen])
+    states, pixels = keys & 0xff, keys >> 8
+    # zombies first, so survivors are drawn over them
+    order = np.argsort((states & trajectory.PHASE_MASK) == trajectory.SURVIVOR, kind='stable')
+    states, pixels = states[order], pixels[order]
+    sprites = {state: entity_sprite(state_color(state)) for state in np.unique(states).tolist()}
+    data.screen.blits([(sprites[state], (px - 2 * r, py - 2 * r)) for state, px, py in
+                       zip(states.tolist(), (pixels % stride).tolist(), (pixels // stride).tolist())], doreturn=False)
+
 
+def draw_survivor(x, y, data: ScreenData, incubating, speed_factor=0):
+    color = survivor_color(incubating, speed_factor)
     pygame.draw.circle(data.screen, color, world_to_screen((x, y), data.pan, data.zoom), config.ENTITY_SIZE)
 
 
@@ -187,35 +300,17 @@ def draw_heatmap(square_size: int, city: generation.City, data: ScreenData):
             pygame.draw.rect(data.screen, color, pygame.Rect(pos, dim))
 
 
-def draw_popmap(square_size: int, survivors, zombies, data: ScreenData):
+def draw_popmap(square_size: int, sector_counts, data: ScreenData):
+    """
+    Draws the population map to the screen in the given ScreenData
+    :param sector_counts: {sector: (survivors, infected, panicked, zombies, corpses)}, as from
+    stats.counts_from_grid over a grid of config.SECTOR_SIZE cells
+    """
     return
-    sector_counts = {}
-    s_max_val = 0
-    z_max_val = 0
-    for s in survivors:
-        sector = sectors.containing_sector((s.x, s.y))
-        if sector not in sector_counts.keys():
-            sector_counts[sector] = (0, 0)
-        s, z = sector_counts[sector]
-        s += 1
-        sector_counts[sector] = s, z
-        if s > s_max_val:
-            s_max_val = s
-
-    for z in zombies:
-        sector = sectors.containing_sector((z.x, z.y))
-        if sector not in sector_counts.keys():
-            sector_counts[sector] = (0, 0)
-        s, z = sector_counts[sector]
-        z += 1
-        sector_counts[sector] = s, z
-        if z > z_max_val:
-            z_max_val = z
-
-    total_pop = len(survivors) + len(zombies)
-    # z_max_val /= total_pop
-    # s_max_val /= total_pop
-    """ Draws the population map to the screen in the given ScreenData """
+    sector_counts = {sector: (c[0], c[3] + c[4]) for sector, c in sector_counts.items()}
+    s_max_val = max((s for s, _ in sector_counts.values()), default=0)
+    z_max_val = max((z for _, z in sector_counts.values()), default=0)
+
     for sector in sector_counts:
         s, z = sector_counts[sector]
         # world_point, s_intensity, z_intensity = plot
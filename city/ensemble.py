@@ -0,0 +1,186 @@
+"""
+Runs replicate simulations across road seeds and RNG streams on a process pool, and
+aggregates their epidemic curves per iteration. With the array engine each seed's road
+network is published once (see city_store.publish_network) and shared by every worker.
+
+    python -m city.ensemble --seeds 200972 200973 --replicates 8 --engine arrays
+    python -m city.ensemble --snapshot outbreak.snap --replicates 64 --max-ticks 10000
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from typing import Iterable, Iterator, List, Tuple
+
+from . import city_store
+from . import config
+from . import headless
+from . import simulation
+from . import snapshot
+from . import stats
+
+from .rng import RandomStreams
+from .swarm import Swarm
+
+METRICS = ['survivors', 'infected', 'panicked', 'zombies', 'corpses', 'eligible', 'r0']
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# engines that can run inside a pool worker; the partitioned swarm needs processes of its own
+ENGINES = tuple(engine for engine in simulation.ENGINES if engine != 'partitioned')
+
+
+def run_replicate(job: Tuple[int, int, str, int, str, str]) -> Tuple[int, int, pd.DataFrame]:
+    """
+    Runs one replicate. Replicate 0 of a seed draws the same numbers as headless.run with that
+    seed; the others seed the run's random streams from (seed, replicate).
+    :param job: (road seed, replicate number, engine, max ticks, snapshot, network), where a
+    snapshot file, if given, is the starting point of every replicate in place of the seed's
+    city, and a network file from city_store.publish_network is the seed's city for the array
+    engine
+    :return: (seed, replicate, summary stats with an r0 column)
+    """
+    seed, replicate, engine, max_ticks, snapshot_path, network_path = job
+    rng = RandomStreams([seed, replicate]) if replicate else None
+    if snapshot_path is not None:
+        sim = snapshot.load(snapshot_path, rng)
+    elif network_path is not None:
+        network = city_store.SharedNetwork(network_path)
+        sim = Swarm.from_network(network, network.densities,
+                                 RandomStreams(network.default_seed) if rng is None else rng)
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            city = city_store.generate(seed)
+        sim = simulation.create(city, engine, rng)
+    recorder = stats.StatsRecorder()
+    headless.simulate(sim, recorder, max_ticks)
+
+    summary_stats_df = recorder.summary()
+    summary_stats_df['r0'] = recorder.r0_per_iteration
+    return seed, replicate, summary_stats_df
+
+
+def run_seeds(seeds: Iterable[int] = None, snapshot_path: str = None) -> List[int]:
+    """
+    The road seeds an ensemble runs
+    :param seeds: config.ROAD_SEED by default
+    :param snapshot_path: A snapshot every replicate branches off, which only leaves the seed it
+    was saved with
+    """
+    seeds = None if seeds is None else list(seeds)
+    if snapshot_path is not None:
+        saved_seed = snapshot.describe(snapshot_path)['seed']
+        if seeds is not None and (len(seeds) > 1 or saved_seed not in (None, seeds[0])):
+            raise ValueError(f'The replicates of {snapshot_path} all run from its seed {saved_seed}, '
+                             f'so seeds {seeds} cannot be given as well')
+        if saved_seed is not None:
+            return [saved_seed]
+    return [config.ROAD_SEED] if seeds is None else seeds
+
+
+def replicates(seeds: Iterable[int], count: int, engine: str = None, max_ticks: int = None,
+               workers: int = None, snapshot_path: str = None) -> Iterator[Tuple[int, int, pd.DataFrame]]:
+    """
+    Runs `count` replicates of every seed on a process pool
+    :param seeds: See run_seeds
+    :param workers: Pool size, one per CPU by default
+    :param engine: One of ENGINES, config.ENTITY_ENGINE by default, or for a snapshot the engine it was
+    saved from, which an engine given has to match
+    :param snapshot_path: Branch every replicate off this snapshot, see run_replicate
+    :return: (seed, replicate, summary stats) in the order the replicates finish
+    """
+    if snapshot_path is not None:
+        saved_engine = snapshot.describe(snapshot_path)['engine']
+        if engine is not None and engine != saved_engine:
+            raise ValueError(f'{snapshot_path} was saved from the {saved_engine!r} engine, not {engine!r}')
+        engine = saved_engine
+    engine = config.ENTITY_ENGINE if engine is None else engine
+    if engine not in ENGINES:
+        raise ValueError(f'Engine {engine!r} cannot run in an ensemble, expected one of {ENGINES}')
+    seeds = run_seeds(seeds, snapshot_path)
+    with tempfile.TemporaryDirectory() as network_dir:
+        # the object engine needs a city of its own in each worker, the array engine shares one network per seed
+        network_paths = dict.fromkeys(seeds)
+        if engine == 'arrays' and snapshot_path is None:
+            for seed in seeds:
+                network_paths[seed] = os.path.join(network_dir, f'network_{seed}.bin')
+                with contextlib.redirect_stdout(io.StringIO()):
+                    city_store.publish_network(network_paths[seed], city_store.generate(seed))
+
+        jobs = [(seed, replicate, engine, max_ticks, snapshot_path, network_paths[seed])
+                for seed in seeds for replicate in range(count)]
+        with multiprocessing.Pool(workers or os.cpu_count()) as pool:
+            # one job at a time per worker keeps every core busy until the last replicates
+            yield from pool.imap_unordered(run_replicate, jobs, chunksize=1)
+
+
+def aggregate(summaries: List[pd.DataFrame], quantiles=QUANTILES) -> pd.DataFrame:
+    """
+    Combines replicate summaries into per-iteration statistics. A replicate that ended early
+    keeps its final counts for the later iterations.
+    :return: Frame indexed by iteration with (metric, statistic) columns, the statistics being
+    'mean' and each quantile
+    """
+    iterations = sorted(set().union(*(summary.index for summary in summaries)))
+    aligned = [summary[METRICS].astype(float).reindex(iterations).ffill() for summary in summaries]
+    stacked = np.stack([frame.to_numpy() for frame in aligned])
+
+    columns = {}
+    for m, metric in enumerate(METRICS):
+        columns[(metric, 'mean')] = np.nanmean(stacked[:, :, m], axis=0)
+        for q in quantiles:
+            columns[(metric, f'q{q:g}')] = np.nanquantile(stacked[:, :, m], q, axis=0)
+    ensemble_df = pd.DataFrame(columns, index=pd.Index(iterations, name='iteration'))
+    ensemble_df.columns = pd.MultiIndex.from_tuples(ensemble_df.columns, names=['metric', 'statistic'])
+    return ensemble_df
+
+
+def run(seeds: Iterable[int], count: int, engine: str = None, max_ticks: int = None,
+        workers: int = None, data_dir: str = 'data', verbose: bool = True, snapshot_path: str = None) -> pd.DataFrame:
+    """
+    Runs the ensemble, writing each replicate's summary as it finishes and the aggregate at the end
+    :return: The aggregated stats from aggregate()
+    """
+    seeds = run_seeds(seeds, snapshot_path)
+    summaries = []
+    for seed, replicate, summary_stats_df in replicates(seeds, count, engine, max_ticks, workers, snapshot_path):
+        summary_stats_df.to_csv(os.path.join(data_dir, f'summary_stats_{seed}_{replicate}.csv'))
+        summaries.append(summary_stats_df)
+        if verbose:
+            final = summary_stats_df.iloc[-1]
+            print(f'[{len(summaries)}/{len(seeds) * count}] seed {seed} replicate {replicate}: '
+                  f'{summary_stats_df.index[-1]} iterations, {int(final.survivors)} survivors, '
+                  f'r0 {final.r0:.3f}')
+
+    ensemble_df = aggregate(summaries)
+    ensemble_df.to_pickle(os.path.join(data_dir, 'ensemble_stats.pk'))
+    ensemble_df.to_csv(os.path.join(data_dir, 'ensemble_stats.csv'))
+    return ensemble_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run replicate simulations and aggregate their curves.')
+    parser.add_argument('--seeds', type=int, nargs='+', default=None,
+                        help=f'road seeds to run, {config.ROAD_SEED} or that of the snapshot by default')
+    parser.add_argument('--replicates', type=int, default=4, help='runs per seed')
+    parser.add_argument('--engine', choices=ENGINES, default=None,
+                        help=f'entity engine to simulate with, {config.ENTITY_ENGINE} or that of the snapshot '
+                             f'by default')
+    parser.add_argument('--max-ticks', type=int, default=None, help='stop each run after this many ticks')
+    parser.add_argument('--workers', type=int, default=None, help='pool size, one per CPU by default')
+    parser.add_argument('--data-dir', default='data', help='where to write the stats files')
+    parser.add_argument('--quiet', action='store_true', help='do not report replicates as they finish')
+    parser.add_argument('--snapshot', default=None, help='branch every replicate off this snapshot file')
+    args = parser.parse_args(argv)
+
+    run(args.seeds, args.replicates, args.engine, args.max_ticks, args.workers, args.data_dir,
+        verbose=not args.quiet, snapshot_path=args.snapshot)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,42 +1,72 @@
-import random
-import math
-
 from abc import abstractmethod
 from abc import ABC
-
-from city.drawing import ScreenData
-import numpy as np
+from typing import TYPE_CHECKING
 
 from city.vectors import distance, distance2
 
+if TYPE_CHECKING:
+    from city.drawing import ScreenData
+    from city.rng import RandomStreams
+
+# the EntityIndex counts that add up to the entities of each type; panicked survivors steer by
+# 'Entity', which is no entity's type, so they only avoid the busiest links
+TYPE_TALLIES = {
+    'Survivor': ('survivors', 'remains'),
+    'Zombie': ('zombies', 'rising', 'corpses'),
+}
+
+
+class EntityList:
+    """
+    Insertion-ordered collection of entities with constant-time append and remove,
+    for the population lists that lose members every tick
+    """
+
+    def __init__(self, entities=()):
+        self._entities = dict.fromkeys(entities)
+
+    def __len__(self):
+        return len(self._entities)
+
+    def __iter__(self):
+        return iter(self._entities)
+
+    def __contains__(self, entity):
+        return entity in self._entities
+
+    def append(self, entity):
+        self._entities[entity] = None
+
+    def remove(self, entity):
+        del self._entities[entity]
+
 
 class Entity(ABC):
     current_id = 0
 
-    def __init__(self, city, road=None, x=None, y=None, road_population_densities=None):
+    def __init__(self, city, rng: 'RandomStreams', road=None, x=None, y=None, road_population_densities=None,
+                 t=None):
         Entity.current_id += 1
         self.id = Entity.current_id
-        self.road = city.roads[random.randint(0, len(city.roads) - 1)]
+        self.rng = rng
         if road is None:
             if road_population_densities is None:
-                self.road = city.roads[random.randint(0, len(city.roads) - 1)]
+                self.road = rng.spawn.choice(city.roads)
             else:
-                self.road = np.random.choice(city.roads, p=road_population_densities)
+                self.road = city.roads[rng.spawn.generator.choice(len(city.roads), p=road_population_densities)]
         else:
             self.road = road
 
-        if x is None or y is None:
-            sx, sy = self.road.start
-            ex, ey = self.road.end
-            rp = random.random()
-            self.x = sx + rp * (ex - sx)
-            self.y = sy + rp * (ey - sy)
+        # the canonical position is the distance along the road, world x/y are derived from it
+        if t is not None:
+            self.t = t
+        elif x is None or y is None:
+            rp = rng.spawn.random()
+            self.t = rp * self.road.geometry.length
         else:
-            self.x = x
-            self.y = y
+            self.t = self.road.distance_along((x, y))
 
-        self.road.entities.append(self)
-        self.direction = 1 if random.random() > 0.5 else -1
+        self.direction = 1 if rng.spawn.random() > 0.5 else -1
         self.is_dead = False
         self.is_panicked = False
         self.is_infected = False
@@ -47,6 +77,7 @@ class Entity(ABC):
         self.panic_time_initial = 0
         self.nearby_entities = []
         self.just_infected = False
+        self.road.entities.add(self, self.t)
 
     def __str__(self):
         return f'id:{self.id} ({type(self).__name__})'
@@ -54,48 +85,48 @@ class Entity(ABC):
     def __repr__(self):
         return self.__str__()
 
-    def get_unit_road_vector(self):
-        sx, sy = self.road.start
-        ex, ey = self.road.end
-        dx, dy = ex - sx, ey - sy
-        l = math.sqrt(dx * dx + dy * dy)
-        dx /= l
-        dy /= l
-        return dx, dy
+    @property
+    def x(self) -> float:
+        geometry = self.road.geometry
+        return geometry.start[0] + geometry.unit[0] * self.t
 
-    def random_wander(self, speed, direction_change_probability=0.0, entity_check_range=0.0,
-                      towards_higher_density=None, target_entity_type=None, target_follow_probability=1.9):
-        dx, dy = self.get_unit_road_vector()
+    @property
+    def y(self) -> float:
+        geometry = self.road.geometry
+        return geometry.start[1] + geometry.unit[1] * self.t
 
-        self.x += dx * self.direction * speed
-        self.y += dy * self.direction * speed
+    def position(self):
+        """ Gets the world coordinates of this entity """
+        geometry = self.road.geometry
+        (sx, sy), (ux, uy) = geometry.start, geometry.unit
+        return sx + ux * self.t, sy + uy * self.t
 
-        # is the entity heading towards the start or end of the road
-        (sx, sy), (ex, ey) = self.road.start, self.road.end
-        xd = (ex - sx)
-        if xd == 0.0:
-            xd = 1.0
-        yd = (ey - sy)
-        if yd == 0.0:
-            yd = 1.0
+    def get_unit_road_vector(self):
+        return self.road.geometry.unit
 
-        xf = (self.x - sx) / xd
-        yf = (self.y - sy) / yd
+    def random_wander(self, speed, direction_change_probability=0.0, entity_check_range=0.0,
+                      towards_higher_density=None, target_entity_type=None, target_follow_probability=1.9):
+        geometry = self.road.geometry
+        movement = self.rng.movement
 
-        rt = xf if math.fabs(xd) > math.fabs(yd) else yf
+        self.t += self.direction * speed
+        self.road.entities.move(self, self.t)
 
         # calculate links if we're near the start/end of a road
         links = None
+        entries = None
         road_change = False
-        if rt <= 0:
+        if self.t <= 0:
             # we're at the beginning of the road.
-            links = list(self.road.links_s)
+            links = list(geometry.links_s)
+            entries = geometry.enter_s
             road_change = True
-        elif rt >= 1:
+        elif self.t >= geometry.length:
             # we're at the end of the road.
-            links = list(self.road.links_e)
+            links = list(geometry.links_e)
+            entries = geometry.enter_e
             road_change = True
-        elif random.random() < direction_change_probability:
+        elif movement.random() < direction_change_probability:
             self.direction = - self.direction
 
         # check for nearby entities
@@ -112,17 +143,30 @@ class Entity(ABC):
             self.is_near_live_things = False
             nearby_dead_entities = []
             nearby_live_entities = []
+            position = self.position()
             for link in links:
-                nde = [e for e in link.entities if (e.is_dead and
-                                                    distance((self.x, self.y), (e.x, e.y)) < entity_check_range)]
+                # only the entities in this window along the road can be in range
+                same_road = link is self.road
+                along = self.t if same_road else link.distance_along(position)
+                window = link.entities.window(along - entity_check_range, along + entity_check_range)
+                nde = []
+                nle = []
+                for e in window:
+                    if same_road:
+                        d = abs(e.t - self.t)
+                    else:
+                        d = distance(position, e.position())
+                    if d < entity_check_range:
+                        if e.is_dead:
+                            nde.append(e)
+                        else:
+                            nle.append(e)
                 is_near_dead_things = any(nde)
                 if is_near_dead_things:
                     nearby_dead_entities.extend(nde)
                     if not self.is_dead:
                         ignored_links.add(link)
 
-                nle = [e for e in link.entities if (not e.is_dead and
-                                                    distance((self.x, self.y), (e.x, e.y)) < entity_check_range)]
                 is_near_live_things = any(nle)
                 if is_near_live_things:
                     nearby_live_entities.extend(nle)
@@ -135,8 +179,8 @@ class Entity(ABC):
 
             # remove current road from list.
             links.remove(self.road)
-            # remove any dead links
-            links = list(set(links) - ignored_links)
+            # remove any dead links, keeping the order deterministic
+            links = [link for link in links if link not in ignored_links]
 
         # if links is set, then we're near the beginning/end of a road.
         # it may be empty, but we need to process it
@@ -144,40 +188,51 @@ class Entity(ABC):
             # need to change road/direction
             if len(links) == 0:
                 self.direction = - self.direction
+                enter_start = self.t <= 0
             else:
                 # time to change roads
                 self.road.entities.remove(self)
-                follow_target = random.random() < target_follow_probability
+                follow_target = movement.random() < target_follow_probability
                 if towards_higher_density is None or target_entity_type is None or follow_target:
-                    self.road = links[random.randint(0, len(links) - 1)]
+                    self.road = movement.choice(links)
                 else:
                     dm = -1 if towards_higher_density else 1
-                    density_sorted_roads = sorted(links, key=lambda l: dm * (len([e for e in l.entities
-                                                                             if type(e).__name__ == target_entity_type])
-                                                                             ))
+                    # the counts that make up the entities of the target type on each link
+                    tallies = TYPE_TALLIES.get(target_entity_type, ())
+                    density_sorted_roads = sorted(links, key=lambda l: dm * l.entities.count(*tallies))
 
                     min_density = min([len(link.entities) for link in density_sorted_roads])
                     density_sorted_roads = [link for link in density_sorted_roads if len(link.entities) == min_density]
-                    ix = random.randint(0, len(density_sorted_roads) - 1)
-                    self.road = density_sorted_roads[ix]
+                    self.road = movement.choice(density_sorted_roads)
+                enter_start = entries[self.road]
 
-                self.road.entities.append(self)
-
-            # check start and end and update self position
-            (sx, sy), (ex, ey) = self.road.start, self.road.end
-            ds2 = math.fabs(self.x - sx) ** 2 + math.fabs(self.y - sy) ** 2
-            de2 = math.fabs(self.x - ex) ** 2 + math.fabs(self.y - ey) ** 2
-            if ds2 < de2:
+            # update self position to the end of the road we're starting from
+            if enter_start:
                 # starting at beginning of road
-                self.x, self.y = sx, sy
+                self.t = 0.0
                 self.direction = 1
             else:
                 # starting at end of road
-                self.x, self.y = ex, ey
+                self.t = self.road.geometry.length
                 self.direction = -1
 
+            if self in self.road.entities:
+                self.road.entities.move(self, self.t)
+            else:
+                self.road.entities.add(self, self.t)
+
+    @abstractmethod
+    def tally(self) -> tuple:
+        """ Gets the roads.TALLIES this entity counts under in its road's EntityIndex """
+        pass
+
+    @abstractmethod
+    def color(self):
+        """ Gets the colour drawing.draw_entities shows this entity in, or None to leave it out """
+        pass
+
     @abstractmethod
-    def draw(self, screen_data: ScreenData):
+    def draw(self, screen_data: 'ScreenData'):
         pass
 
     @abstractmethod
@@ -55,6 +55,8 @@ def generate(manual_seed: int = None) -> City:
                 new_seg.t += seg.t + 1
                 road_queue.push(new_seg)
 
+    roads.bake(city.roads)
+
     watch_total.stop()
     print("Time spent (ms): {}".format(watch_total.passed_ms()))
 
@@ -0,0 +1,131 @@
+"""
+Runs the simulation without pygame, as fast as the CPU allows, and writes the same stats
+files as the interactive app.
+
+    python -m city.headless --seed 200972 --engine arrays --max-ticks 10000
+    python -m city.headless --max-ticks 3000 --save-snapshot outbreak.snap
+    python -m city.headless --restore outbreak.snap --max-ticks 10000
+    python -m city.headless --engine arrays --trajectory outbreak.traj --trajectory-interval 4
+"""
+import argparse
+import random
+
+import numpy as np
+
+from . import city_store
+from . import config
+from . import simulation
+from . import snapshot
+from . import stats
+from . import trajectory
+
+
+def run(seed: int = None, engine: str = None, max_ticks: int = None, data_dir: str = 'data',
+        verbose: bool = True, restore: str = None, save_snapshot: str = None, trajectory_dir: str = None,
+        trajectory_interval: int = None):
+    """
+    Generates a city, spawns the population and runs ticks until every survivor has turned or
+    max_ticks is reached
+    :param seed: Road seed, config.ROAD_SEED by default, or for a restored run the seed of its snapshot
+    :param engine: One of simulation.ENGINES, config.ENTITY_ENGINE by default
+    :param max_ticks: Stop once the iteration reaches this, even if survivors remain
+    :param data_dir: Directory to write the raw/summary stats to
+    :param verbose: Print the final r0 and RNG checks like the interactive app
+    :param restore: Carry on from this snapshot instead of generating a city; its engine is used
+    :param save_snapshot: Where to write a snapshot of the simulation once it stops
+    :param trajectory_dir: Where to record the entities' trajectories, see trajectory.py
+    :param trajectory_interval: Record every this many ticks, config.TRAJECTORY_INTERVAL by default
+    :return: The summary stats
+    """
+    if restore is not None:
+        saved_seed = snapshot.describe(restore)['seed']
+        if seed is not None and saved_seed is not None and seed != saved_seed:
+            raise ValueError(f'{restore} was saved from a run with seed {saved_seed}, not {seed}')
+        seed = saved_seed if seed is None else seed
+    seed = config.ROAD_SEED if seed is None else seed
+    engine = config.ENTITY_ENGINE if engine is None else engine
+    if save_snapshot is not None and restore is None and engine == 'partitioned':
+        raise ValueError('The partitioned engine cannot be snapshotted')
+    if restore is None:
+        city = city_store.generate(seed)
+        sim = simulation.create(city, engine)
+    else:
+        sim = snapshot.load(restore)
+    recorder = stats.StatsRecorder(raw_stats=stats.raw_stats_writer(seed, data_dir))
+    tracks = None
+    if trajectory_dir is not None:
+        tracks = trajectory.TrajectoryRecorder(trajectory_dir, trajectory.road_network(sim), trajectory_interval)
+    iteration, r0 = simulate(sim, recorder, max_ticks, tracks)
+    if save_snapshot is not None:
+        snapshot.save(save_snapshot, sim, seed)
+
+    summary_stats_df = recorder.write(seed, data_dir)
+
+    if verbose:
+        print()
+        print(f'Iterations: {iteration}')
+        print(f'r0    : {r0}')
+        print()
+        print(f'np.random check: {np.random.randint(0, 100)}')
+        print(f'random check   : {random.randint(0, 100)}')
+
+    return summary_stats_df
+
+
+def simulate(sim, recorder: stats.StatsRecorder, max_ticks: int = None,
+             tracks: trajectory.TrajectoryRecorder = None):
+    """
+    Steps a simulation until every survivor has turned or max_ticks is reached, sampling stats
+    as the interactive app does
+    :param sim: A simulation from simulation.create or snapshot.load
+    :param tracks: Records the trajectories as well, and is closed at the end
+    :return: (iteration reached, final r0 estimate)
+    """
+    iteration = sim.iteration
+    try:
+        while True:
+            eligible_count, r0 = sim.eligible_count()
+            recorder.gather(iteration, sim, eligible_count, r0=r0)
+
+            if not sim.has_survivors() or (max_ticks is not None and iteration >= max_ticks):
+                recorder.gather(iteration, sim, eligible_count, force=True, r0=r0)
+                if tracks is not None:
+                    tracks.record(sim, force=True)
+                break
+
+            if tracks is not None:
+                tracks.record(sim)
+
+            sim.step()
+            iteration += 1
+    finally:
+        # a partitioned sim's worker processes and a recorder's writer threads stop even if a step fails
+        if tracks is not None:
+            tracks.close()
+        if hasattr(sim, 'close'):
+            sim.close()
+    return iteration, r0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the zombie simulation without a display.')
+    parser.add_argument('--seed', type=int, default=None,
+                        help=f'road seed for the city, {config.ROAD_SEED} or that of the restored snapshot by default')
+    parser.add_argument('--engine', choices=simulation.ENGINES, default=config.ENTITY_ENGINE,
+                        help='entity engine to simulate with')
+    parser.add_argument('--max-ticks', type=int, default=None, help='stop once this iteration is reached')
+    parser.add_argument('--data-dir', default='data', help='where to write the stats files')
+    parser.add_argument('--quiet', action='store_true', help='only print generation output')
+    parser.add_argument('--restore', default=None, help='carry on from this snapshot file')
+    parser.add_argument('--save-snapshot', default=None, help='write a snapshot here when the run stops')
+    parser.add_argument('--trajectory', default=None, help='record the trajectories to this directory')
+    parser.add_argument('--trajectory-interval', type=int, default=None, help='record every this many ticks')
+    args = parser.parse_args(argv)
+
+    run(args.seed, args.engine, args.max_ticks, args.data_dir, verbose=not args.quiet, restore=args.restore,
+        save_snapshot=args.save_snapshot, trajectory_dir=args.trajectory,
+        trajectory_interval=args.trajectory_interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import numpy as np
+
+from typing import List
+
+from . import roads
+
+
+class Network:
+    """
+    Flat array view of a generated road network. Road i is city.roads[i]; the links leaving
+    end e of road i (e = 0 for the start, 1 for the end) are
+    link_road[link_ptr[2 * i + e]:link_ptr[2 * i + e + 1]], and link_enter_start says
+    whether each linked road is entered at its start.
+    """
+
+    def __init__(self, start: np.ndarray, end: np.ndarray, link_ptr: np.ndarray,
+                 link_road: np.ndarray, link_enter_start: np.ndarray, length: np.ndarray = None,
+                 unit: np.ndarray = None):
+        """
+        :param length: Length of each road, worked out from start and end if not given
+        :param unit: Unit vector along each road, worked out from start and end if not given
+        """
+        self.start = start
+        self.end = end
+        self.link_ptr = link_ptr
+        self.link_road = link_road
+        self.link_enter_start = link_enter_start
+
+        if length is None or unit is None:
+            delta = end - start
+            length = np.hypot(delta[:, 0], delta[:, 1])
+            safe_length = np.where(length > 0, length, 1.0)
+            unit = delta / safe_length[:, None]
+        self.length = length
+        self.unit = unit
+
+    def __len__(self):
+        return len(self.length)
+
+    @classmethod
+    def from_roads(cls, all_roads: List[roads.Segment]) -> 'Network':
+        """
+        Builds the arrays for a list of connected segments
+        :param all_roads: The roads of a generated city
+        :return: The network, indexed in the same order as all_roads
+        """
+        index = {road: i for i, road in enumerate(all_roads)}
+
+        start = np.array([road.start for road in all_roads], dtype=np.float64).reshape(-1, 2)
+        end = np.array([road.end for road in all_roads], dtype=np.float64).reshape(-1, 2)
+
+        link_ptr = [0]
+        link_road = []
+        link_enter_start = []
+        for road in all_roads:
+            geometry = road.geometry if road.is_baked else roads.make_geometry(road)
+            for links, enter in ((geometry.links_s, geometry.enter_s), (geometry.links_e, geometry.enter_e)):
+                for link in links:
+                    if link not in index:
+                        continue
+                    link_road.append(index[link])
+                    link_enter_start.append(enter[link])
+                link_ptr.append(len(link_road))
+
+        return cls(start, end,
+                   np.array(link_ptr, dtype=np.int64),
+                   np.array(link_road, dtype=np.int32),
+                   np.array(link_enter_start, dtype=bool))
+
+    def links(self, road: np.ndarray, end: np.ndarray):
+        """
+        Gets the flattened link lists for a batch of road ends
+        :param road: Road indices
+        :param end: 0 for the start of each road, 1 for the end
+        :return: (owner, flat) where owner is the position in the batch each link belongs to
+        and flat indexes link_road/link_enter_start
+        """
+        slot = 2 * road.astype(np.int64) + end
+        lo = self.link_ptr[slot]
+        counts = self.link_ptr[slot + 1] - lo
+        owner = np.repeat(np.arange(len(road)), counts)
+        return owner, ranges(lo, counts)
+
+    def point_at(self, road: np.ndarray, distance: np.ndarray):
+        """ Gets the world coordinates of points the given distance from the start of each road """
+        x = self.start[road, 0] + self.unit[road, 0] * distance
+        y = self.start[road, 1] + self.unit[road, 1] * distance
+        return x, y
+
+
+def ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """ Concatenates range(start, start + count) for each pair, without a Python loop """
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(np.asarray(starts, dtype=np.int64) - offsets, counts) + np.arange(total)
@@ -0,0 +1,332 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from typing import Dict, List
+
+from . import config
+from . import stats
+from . import trajectory
+from .rng import RandomStreams
+from .swarm import Swarm, FIELDS, SURVIVOR, ZOMBIE
+
+# what one worker sends another after each half of a tick: (ghosts, migrants)
+Parcel = tuple
+# what a worker reports after each half of a tick: ({block: Parcel}, (ids of the ghosts its zombies
+# bit, their incubation times), entities per road)
+Handover = tuple
+
+
+class PartitionedSwarm:
+    """
+    Runs a Swarm on a pool of worker processes. The sector columns are split into contiguous
+    blocks and each worker owns the entities whose position is in its block. Each tick is run
+    in the two halves of Swarm.step, and after each half every worker sends its neighbours a
+    ghost copy of the entities within halo_width() of their block, as they are at that point.
+    Between the halves the bites on ghosts are passed to every block and the entities per road
+    are counted over all blocks, and after the second half the entities that crossed a block
+    edge go to their new owner. Ghosts are never moved by the worker holding them, bar the
+    survivors' own move in the second half, which depends on nothing but the survivor.
+
+    Every worker so sees what a single Swarm would at each point of the tick, and as the draws
+    are keyed on entity ids a run gives the same tracks as the 'arrays' engine for the same
+    seed, whatever the number of workers.
+
+    Offers the same step/population/sector_grid/sector_counts/tracks/draw/eligible_count/
+    has_survivors interface as Swarm.
+    """
+
+    def __init__(self, swarm: Swarm, workers: int = None):
+        """
+        Splits a populated swarm over worker processes
+        :param swarm: The starting population; it is copied, not shared
+        :param workers: Number of processes, config.PARTITION_WORKERS or one per CPU by default
+        """
+        if workers is None:
+            workers = config.PARTITION_WORKERS or os.cpu_count() or 1
+        idx = np.arange(swarm.count)
+        x, _ = swarm.xy(idx)
+        self.edges = block_edges(x, workers)
+        owner = block_of(self.edges, x)
+
+        self.network = swarm.network
+        self.iteration = swarm.iteration
+        # the population and r0 the workers report with each step, so reading them costs nothing
+        self.counts = swarm.population()
+        _, self.r0 = swarm.eligible_count()
+        self.connections = []
+        self.processes = []
+        for block in range(len(self.edges) - 1):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_work,
+                                              args=(child, swarm.network, self.edges, block,
+                                                    swarm.take(idx[owner == block]),
+                                                    swarm.rng.seed, swarm.iteration,
+                                                    swarm.id[swarm.nearby[1]]),
+                                              daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+        self._hand_over(self._ask('share'))
+
+    def step(self):
+        self._hand_over(self._ask('hunt'))
+        replies = self._ask('flee')
+        self._hand_over([handover for handover, _ in replies])
+        self.iteration += 1
+
+        counts = {}
+        for _, (population, _, _, _) in replies:
+            for tally, count in population.items():
+                counts[tally] = counts.get(tally, 0) + count
+        # a survivor can be found by zombies in more than one block, through its ghosts
+        counts['eligible'] = len(np.unique(np.concatenate([ids for _, (_, ids, _, _) in replies])))
+        self.counts = counts
+        infected = sum(infected for _, (_, _, infected, _) in replies)
+        zombies = sum(zombies for _, (_, _, _, zombies) in replies)
+        self.r0 = float(infected / max(1, zombies))
+
+    def _hand_over(self, handovers: List[Handover]):
+        """ Delivers what the workers reported to the blocks it is for """
+        for connection, delivery in zip(self.connections, route(handovers, len(self.connections))):
+            connection.send(('deliver', delivery))
+
+    def _ask(self, command: str) -> list:
+        for connection in self.connections:
+            connection.send((command, None))
+        return [connection.recv() for connection in self.connections]
+
+    def has_survivors(self) -> bool:
+        return self.counts['survivors'] > 0
+
+    def population(self) -> Dict[str, int]:
+        """ Same result as Swarm.population over every partition """
+        return dict(self.counts)
+
+    def sector_grid(self, cell_size: float = None) -> stats.SectorGrid:
+        """ Same result as Swarm.sector_grid over every partition """
+        for connection in self.connections:
+            connection.send(('sector_grid', cell_size))
+        return stats.merge_grids([connection.recv() for connection in self.connections])
+
+    def sector_counts(self):
+        """ Same result as Swarm.sector_counts over every partition """
+        return stats.counts_from_grid(self.sector_grid())
+
+    def tracks(self) -> trajectory.Tracks:
+        """ Same result as Swarm.tracks over every partition """
+        return trajectory.Tracks(*(np.concatenate(column) for column in zip(*self._ask('tracks'))))
+
+    def draw(self, screen_data):
+        """ Same result as Swarm.draw over every partition """
+        from .drawing import draw_states
+        tracks = self.tracks()
+        x, y = self.network.point_at(tracks.road, tracks.pos)
+        draw_states(x, y, tracks.state, screen_data)
+
+    def eligible_count(self):
+        """ Same result as Swarm.eligible_count over every partition """
+        return self.counts['eligible'], self.r0
+
+    def close(self):
+        """ Stops the worker processes """
+        for connection in self.connections:
+            connection.send(('close', None))
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+
+def halo_width() -> float:
+    """
+    How far past its block edges a worker has to see: the largest interaction range, plus
+    twice the furthest anything can move in a tick, as a ghost survivor moves before the
+    survivors look around
+    """
+    return (max(config.ZOMBIE_HUNT_RANGE, config.SURVIVOR_PANIC_RANGE, config.ZOMBIE_ATTACK_RANGE) +
+            2 * max(config.SURVIVOR_PANIC_SPEED, config.ZOMBIE_HUNT_SPEED))
+
+
+def block_edges(x: np.ndarray, workers: int) -> np.ndarray:
+    """
+    Splits the sector columns into at most `workers` contiguous blocks holding about the same
+    number of entities
+    :param x: World x coordinate of every entity
+    :return: The world x of each block's edges, starting at -inf and ending at inf
+    """
+    columns = np.floor_divide(x, config.SECTOR_SIZE)
+    cuts = np.quantile(columns, np.linspace(0, 1, workers + 1)[1:-1]) if len(x) else []
+    cuts = np.unique(np.ceil(cuts)) * config.SECTOR_SIZE
+    return np.concatenate([[-np.inf], cuts, [np.inf]])
+
+
+def block_of(edges: np.ndarray, x: np.ndarray) -> np.ndarray:
+    return np.searchsorted(edges, x, side='right') - 1
+
+
+def route(handovers: List[Handover], blocks: int) -> list:
+    """
+    Sorts what the workers reported into what each block is to be delivered
+    :return: Per block, (the Parcels for it, every bite on a ghost, entities per road over all blocks)
+    """
+    parcels = [[] for _ in range(blocks)]
+    for outbox, _, _ in handovers:
+        for block, parcel in outbox.items():
+            parcels[block].append(parcel)
+    bitten = np.concatenate([np.zeros(0, dtype=np.int64)] + [ids for _, (ids, _), _ in handovers])
+    incubation = np.concatenate([np.zeros(0, dtype=np.int32)] + [itr for _, (_, itr), _ in handovers])
+    crowding = np.sum([counts for _, _, counts in handovers], axis=0)
+    return [(parcels[block], (bitten, incubation), crowding) for block in range(blocks)]
+
+
+def empty_state() -> Dict[str, np.ndarray]:
+    return {name: np.zeros(0, dtype=dtype) for name, dtype, _ in FIELDS}
+
+
+def concat_states(states: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    if not states:
+        return empty_state()
+    return {name: np.concatenate([state[name] for state in states]) for name, _, _ in FIELDS}
+
+
+def _work(connection, network, edges: np.ndarray, block: int, state: Dict[str, np.ndarray], seed,
+          iteration: int, hunted: np.ndarray):
+    worker = _Worker(network, edges, block, state, RandomStreams(seed), iteration, hunted)
+
+    while True:
+        command, payload = connection.recv()
+        if command == 'deliver':
+            worker.deliver(payload)
+        elif command == 'share':
+            connection.send(worker.hand_over(migrate=True))
+        elif command == 'hunt':
+            connection.send(worker.hunt())
+        elif command == 'flee':
+            connection.send(worker.flee())
+        elif command == 'sector_grid':
+            connection.send(worker.swarm.sector_grid(payload))
+        elif command == 'tracks':
+            connection.send(worker.swarm.tracks())
+        elif command == 'close':
+            connection.close()
+            return
+
+
+class _Worker:
+    """ The block of a PartitionedSwarm owned by one process """
+
+    def __init__(self, network, edges: np.ndarray, block: int, state: Dict[str, np.ndarray],
+                 rng: RandomStreams, iteration: int, hunted: np.ndarray):
+        # the draws are keyed on entity ids, so every worker can share the master's streams
+        self.swarm = Swarm(network, 2 * len(state['id']), rng)
+        self.swarm.iteration = iteration
+        self.swarm.put(state)
+        self.edges = edges
+        self.block = block
+        self.ghost = np.zeros(0, dtype=np.int64)
+        self.ghost_incubation = np.zeros(0, dtype=np.int32)
+        # ids of the entities this block's zombies found on their last hunt
+        self.hunted = hunted
+
+    def deliver(self, delivery):
+        """ Takes in the ghosts, migrants and bites from the other blocks, see route """
+        parcels, (bitten, incubation), crowding = delivery
+        swarm = self.swarm
+        swarm.put(concat_states([migrants for _, migrants in parcels]))
+        self.ghost = swarm.put(concat_states([ghosts for ghosts, _ in parcels]))
+        swarm.is_ghost[self.ghost] = True
+        _apply_bites(swarm, bitten, incubation)
+        self.ghost_incubation = swarm.incubation_time_remaining[self.ghost].copy()
+        swarm.crowding = crowding
+
+    def hunt(self) -> Handover:
+        """ Runs the zombies' half of the tick """
+        swarm = self.swarm
+        swarm.step_zombies()
+        self.hunted = np.unique(swarm.id[swarm.nearby[1]])
+
+        # bites on ghosts go to every block, to reach the owner and the other ghosts alike
+        ghost = self.ghost
+        bit = ghost[swarm.incubation_time_remaining[ghost] != self.ghost_incubation]
+        return self.hand_over((swarm.id[bit].copy(), swarm.incubation_time_remaining[bit].copy()))
+
+    def flee(self):
+        """
+        Runs the survivors' half of the tick
+        :return: (Handover, (Swarm.population, eligible ids, bites by the zombies, zombie count)),
+        the migrants counted as well
+        """
+        swarm = self.swarm
+        # every bite of the tick is in, so which hunted survivors are uninfected is settled until the next hunt
+        eligible = self._eligible()
+        swarm.step_survivors()
+        # the migrants are counted here, as the block they go to only counts them after its next step
+        n = swarm.count
+        zombies = (swarm.kind[:n] == ZOMBIE) & ~swarm.is_ghost[:n]
+        census = (swarm.population(), eligible, int(swarm.infected_count[:n][zombies].sum()),
+                  int(np.count_nonzero(zombies)))
+        return self.hand_over(migrate=True), census
+
+    def hand_over(self, bites=None, migrate: bool = False) -> Handover:
+        """
+        Parcels up ghosts of the owned entities for the blocks they are near, and with migrate
+        the entities that crossed a block edge for their new owner, then lets go of the ghosts
+        held and the migrants
+        """
+        swarm = self.swarm
+        edges = self.edges
+        owned = np.flatnonzero(~swarm.is_ghost[:swarm.count])
+        x, _ = swarm.xy(owned)
+        # entities change owner between ticks only
+        owner = block_of(edges, x) if migrate else np.full(len(owned), self.block)
+
+        outbox = {}
+        halo = halo_width()
+        for to_block in range(len(edges) - 1):
+            near = (owner != to_block) & (x >= edges[to_block] - halo) & (x < edges[to_block + 1] + halo)
+            moving = (owner == to_block) & (to_block != self.block)
+            if np.any(near) or np.any(moving):
+                outbox[to_block] = (swarm.take(owned[near]), swarm.take(owned[moving]))
+
+        if bites is None:
+            bites = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32))
+        crowding = np.bincount(swarm.road[owned], minlength=len(swarm.network))
+        swarm.remove(np.concatenate([self.ghost, owned[owner != self.block]]))
+        self.ghost = np.zeros(0, dtype=np.int64)
+        return outbox, bites, crowding
+
+    def _eligible(self) -> np.ndarray:
+        """ The hunted ids that are of uninfected survivors, owned or ghosts """
+        swarm = self.swarm
+        n = swarm.count
+        uninfected = (swarm.kind[:n] == SURVIVOR) & ~swarm.is_infected[:n]
+        return np.intersect1d(self.hunted, swarm.id[:n][uninfected])
+
+
+def _apply_bites(swarm: Swarm, ids: np.ndarray, incubation: np.ndarray):
+    """
+    Infects the survivors, owned or ghosts, that another block bit as a ghost, keeping the
+    shortest incubation. A bite already in is left as it is.
+    """
+    if len(ids) == 0:
+        return
+    n = swarm.count
+    live = np.flatnonzero(swarm.kind[:n] == SURVIVOR)
+    if len(live) == 0:
+        return
+    order = np.argsort(swarm.id[live], kind='stable')
+    sorted_ids = swarm.id[live][order]
+    found = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    hit = sorted_ids[found] == ids
+    victim = live[order[found[hit]]]
+    incubation = incubation[hit]
+
+    current = swarm.incubation_time_remaining[victim]
+    swarm.incubation_time_remaining[victim] = np.where(current >= 0, current,
+                                                       config.INFECTED_INCUBATION_MAX_TIME + 1)
+    np.minimum.at(swarm.incubation_time_remaining, victim, incubation)
+    swarm.is_infected[victim] = True
@@ -0,0 +1,217 @@
+"""
+Plays back a trajectory recording (see trajectory.py) in the pan-and-zoom viewer, without
+simulating anything.
+
+    python -m city.replay outbreak.traj
+
+Space pauses, R plays in reverse, Up/Down double or halve the speed, Left/Right step a frame
+(or seek a second of play when running), Home/End jump to either end, and clicking or dragging
+the timeline along the bottom seeks. Only the entities on the roads of the visible sectors are
+decoded each frame.
+"""
+import argparse
+import collections
+
+import numpy as np
+import pygame
+
+from typing import Dict, Tuple
+
+from . import config
+from . import drawing
+from . import sectors
+from . import trajectory
+from . import vectors
+
+# height of the timeline along the bottom of the window, in pixels
+TIMELINE_HEIGHT = 16
+SPEED_MIN = 1
+SPEED_MAX = 4096
+
+# what sectors.from_seg needs to know of a road
+RoadEnds = collections.namedtuple("RoadEnds", ["start", "end"])
+
+
+def sector_roads(recording: trajectory.Trajectory) -> Dict[Tuple[int, int], np.ndarray]:
+    """ The indices of the roads in each sector, filed as sectors.add files the city's roads """
+    by_sector = collections.defaultdict(list)
+    for i, (start, end) in enumerate(zip(recording.start.tolist(), recording.end.tolist())):
+        for sector in sectors.from_seg(RoadEnds(tuple(start), tuple(end))):
+            by_sector[sector].append(i)
+    return {sector: np.array(road_indices, dtype=np.int64) for sector, road_indices in by_sector.items()}
+
+
+class Replay:
+    """ The playback state of a recording: where it is, how fast and which way it is going """
+
+    def __init__(self, recording: trajectory.Trajectory, speed: float = None):
+        """
+        :param speed: Ticks played a second, config.SIM_TICK_RATE by default
+        """
+        self.recording = recording
+        self.speed = float(config.SIM_TICK_RATE if speed is None else speed)
+        self.direction = 1
+        self.paused = False
+        self.iteration = float(recording.iterations[0]) if len(recording) else 0.0
+
+    @property
+    def first(self) -> int:
+        return int(self.recording.iterations[0])
+
+    @property
+    def last(self) -> int:
+        return int(self.recording.iterations[-1])
+
+    @property
+    def frame_index(self) -> int:
+        return self.recording.frame_at(int(self.iteration))
+
+    def advance(self, milliseconds: float):
+        """ Moves the play head on by the time passed, stopping at either end """
+        if not self.paused:
+            self.seek(self.iteration + self.direction * self.speed * milliseconds / 1000)
+
+    def seek(self, iteration: float):
+        self.iteration = min(max(iteration, self.first), self.last)
+
+    def step(self, frames: int):
+        """ Moves the play head to the frame the given number of frames away """
+        index = min(max(self.frame_index + frames, 0), len(self.recording) - 1)
+        self.iteration = float(self.recording.iterations[index])
+
+    def change_speed(self, factor: float):
+        self.speed = min(max(self.speed * factor, SPEED_MIN), SPEED_MAX)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play back a recorded run.')
+    parser.add_argument('recording', help='directory written by trajectory.TrajectoryRecorder')
+    parser.add_argument('--speed', type=float, default=None, help='ticks played a second')
+    args = parser.parse_args(argv)
+
+    recording = trajectory.Trajectory(args.recording)
+    if not len(recording):
+        raise ValueError(f'{args.recording} has no frames')
+    replay = Replay(recording, args.speed)
+    roads_by_sector = sector_roads(recording)
+
+    pygame.init()
+    drawing.init()
+    screen_data = drawing.ScreenData(
+        pygame.display.set_mode(config.SCREEN_RES, pygame.RESIZABLE), (500, 540), -22)
+    clock = pygame.time.Clock()
+    dragging = scrubbing = False
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.VIDEORESIZE:
+                screen_data.screen = pygame.display.set_mode(event.dict["size"], pygame.RESIZABLE)
+                config.SCREEN_RES = event.dict["size"]
+            elif event.type == pygame.KEYDOWN:
+                handle_key(replay, event.key)
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 4:
+                    screen_data.zoom_in(event.pos)
+                elif event.button == 5:
+                    screen_data.zoom_out(event.pos)
+                elif event.button == 1:
+                    scrubbing = event.pos[1] >= config.SCREEN_RES[1] - TIMELINE_HEIGHT
+                    dragging = not scrubbing
+                    if scrubbing:
+                        replay.seek(timeline_iteration(replay, event.pos[0]))
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                dragging = scrubbing = False
+            elif event.type == pygame.MOUSEMOTION:
+                if scrubbing:
+                    replay.seek(timeline_iteration(replay, event.pos[0]))
+                elif dragging:
+                    screen_data.pan = vectors.add(screen_data.pan, event.rel)
+
+        replay.advance(clock.get_time())
+        draw_frame(screen_data, replay, roads_by_sector)
+        clock.tick(config.RENDER_FPS)
+
+    pygame.quit()
+
+
+def handle_key(replay: Replay, key):
+    if key == pygame.K_SPACE:
+        replay.paused = not replay.paused
+    elif key == pygame.K_r:
+        replay.direction = -replay.direction
+    elif key == pygame.K_UP:
+        replay.change_speed(2)
+    elif key == pygame.K_DOWN:
+        replay.change_speed(0.5)
+    elif key in (pygame.K_LEFT, pygame.K_RIGHT):
+        sign = 1 if key == pygame.K_RIGHT else -1
+        if replay.paused:
+            replay.step(sign)
+        else:
+            replay.seek(replay.iteration + sign * replay.speed)
+    elif key == pygame.K_HOME:
+        replay.seek(replay.first)
+    elif key == pygame.K_END:
+        replay.seek(replay.last)
+
+
+def timeline_iteration(replay: Replay, x: float) -> float:
+    """ The iteration under a point on the timeline """
+    return replay.first + (replay.last - replay.first) * x / max(1, config.SCREEN_RES[0])
+
+
+def draw_frame(screen_data: drawing.ScreenData, replay: Replay, roads_by_sector: Dict[Tuple[int, int], np.ndarray]):
+    """ Draws the roads and entities of the visible sectors at the play head, then flips the display """
+    recording = replay.recording
+    screen_data.screen.fill((0, 0, 0))
+
+    visible = np.zeros(len(recording.length), dtype=bool)
+    for sector in drawing.visible_sectors(screen_data):
+        if sector in roads_by_sector:
+            visible[roads_by_sector[sector]] = True
+    draw_roads(recording, np.flatnonzero(visible), screen_data)
+
+    frame = recording.frame(replay.frame_index, visible, ids=False)
+    draw_entities(recording, frame, screen_data)
+    draw_timeline(replay, frame, screen_data)
+    pygame.display.flip()
+
+
+def draw_roads(recording: trajectory.Trajectory, road_indices: np.ndarray, data: drawing.ScreenData):
+    (pan_x, pan_y), zoom = data.pan, data.zoom
+    start = recording.start[road_indices] * zoom + (pan_x, pan_y)
+    end = recording.end[road_indices] * zoom + (pan_x, pan_y)
+    for (sx, sy), (ex, ey) in zip(start.tolist(), end.tolist()):
+        pygame.draw.line(data.screen, (64, 64, 64), (sx, sy), (ex, ey), config.ROAD_WIDTH)
+
+
+def draw_entities(recording: trajectory.Trajectory, frame: trajectory.Frame, data: drawing.ScreenData):
+    """ Draws a frame's entities as drawing.draw_entities does, zombies below survivors """
+    x, y = recording.xy(frame)
+    drawing.draw_states(x, y, frame.state, data)
+
+
+def draw_timeline(replay: Replay, frame: trajectory.Frame, data: drawing.ScreenData):
+    """ Draws the timeline with the play head, and the playback state above it """
+    width, height = config.SCREEN_RES
+    top = height - TIMELINE_HEIGHT
+    pygame.draw.rect(data.screen, (32, 32, 32), (0, top, width, TIMELINE_HEIGHT))
+    span = max(1, replay.last - replay.first)
+    head = (frame.iteration - replay.first) / span * width
+    pygame.draw.rect(data.screen, (160, 160, 160), (0, top, head, TIMELINE_HEIGHT))
+
+    state = 'paused' if replay.paused else 'reverse' if replay.direction < 0 else 'playing'
+    phases = np.bincount(frame.state & trajectory.PHASE_MASK, minlength=4)
+    drawing.draw_label_screen((f"Iteration: {frame.iteration} / {replay.last}  ({state}, {replay.speed:g} ticks/s)",
+                               (10, top - 40)), data, 1)
+    drawing.draw_label_screen((f"In the visible sectors: {phases[trajectory.SURVIVOR]} survivors, "
+                               f"{phases[trajectory.ZOMBIE]} zombies, "
+                               f"{phases[trajectory.CORPSE] + phases[trajectory.DESTROYED]} corpses",
+                               (10, top - 22)), data, 1)
+
+
+if __name__ == '__main__':
+    main()
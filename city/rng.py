@@ -0,0 +1,96 @@
+import numpy as np
+
+from typing import Sequence
+
+# named streams, so that e.g. a change to how survivors panic leaves movement draws alone
+SPAWN = 'spawn'
+MOVEMENT = 'movement'
+PANIC = 'panic'
+INFECTION = 'infection'
+STREAMS = (SPAWN, MOVEMENT, PANIC, INFECTION)
+
+# scalar draws are served from blocks of this many numbers drawn at once
+BLOCK_SIZE = 4096
+
+_GOLDEN = np.uint64(0x9e3779b97f4a7c15)
+_MIX_1 = np.uint64(0xbf58476d1ce4e5b9)
+_MIX_2 = np.uint64(0x94d049bb133111eb)
+
+
+class RandomStreams:
+    """
+    The random numbers for one simulation run: a Stream per name in STREAMS, all derived from
+    a single seed. Available as attributes, e.g. rng.movement.random().
+    """
+
+    def __init__(self, seed=None):
+        """
+        :param seed: Anything np.random.SeedSequence accepts; None draws one from the global
+        np.random state, so a run still follows the road seed that generation.generate set
+        """
+        if seed is None:
+            seed = int(np.random.randint(0, 2 ** 63 - 1, dtype=np.int64))
+        self.seed = seed
+        for name, child in zip(STREAMS, np.random.SeedSequence(seed).spawn(len(STREAMS))):
+            setattr(self, name, Stream(child))
+
+    def __getitem__(self, name: str) -> 'Stream':
+        return getattr(self, name)
+
+
+class Stream:
+    """
+    One named stream. Draws come in two kinds:
+
+    - sequential: random/randint/choice for per-entity code, served from pre-drawn blocks so
+      that a draw is a list pop rather than a call into numpy, and array() for whole batches
+    - keyed: uniform/integers give every (entity id, tick, draw) its own number, no matter
+      how the entities are ordered, batched or split between processes
+    """
+
+    def __init__(self, seed_sequence: np.random.SeedSequence):
+        self.generator = np.random.Generator(np.random.PCG64(seed_sequence))
+        self.key = seed_sequence.generate_state(1, np.uint64)[0]
+        self._block = []
+
+    def random(self) -> float:
+        """ A float in [0, 1), like random.random """
+        if not self._block:
+            self._block = self.generator.random(BLOCK_SIZE).tolist()
+        return self._block.pop()
+
+    def randint(self, low: int, high: int) -> int:
+        """ An int in [low, high], like random.randint """
+        return low + int(self.random() * (high - low + 1))
+
+    def choice(self, items: Sequence):
+        return items[int(self.random() * len(items))]
+
+    def array(self, n: int) -> np.ndarray:
+        """ n floats in [0, 1) """
+        return self.generator.random(n)
+
+    def uniform(self, ids: np.ndarray, tick: int, draw: int = 0) -> np.ndarray:
+        """
+        Keyed floats in [0, 1), one per id
+        :param ids: Entity ids
+        :param tick: The simulation iteration
+        :param draw: Distinguishes separate draws for the same entity in the same tick, per id or shared
+        """
+        with np.errstate(over='ignore'):
+            h = _mix(self.key ^ (np.asarray(ids, dtype=np.uint64) * _GOLDEN))
+            h = _mix(h ^ ((np.uint64(tick) << np.uint64(16)) + np.asarray(draw, dtype=np.uint64)))
+        return (h >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+    def integers(self, low: int, high: int, ids: np.ndarray, tick: int, draw: int = 0) -> np.ndarray:
+        """ Keyed ints in [low, high), one per id, as uniform() """
+        return low + (self.uniform(ids, tick, draw) * (high - low)).astype(np.int64)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """ The splitmix64 finaliser, spreading every input bit over the whole output """
+    x = x ^ (x >> np.uint64(30))
+    x = x * _MIX_1
+    x = x ^ (x >> np.uint64(27))
+    x = x * _MIX_2
+    return x ^ (x >> np.uint64(31))
@@ -1,4 +1,5 @@
 import heapq
+import bisect
 from . import snap_type as st
 from . import vectors
 import math
@@ -7,6 +8,17 @@ from typing import Tuple, Optional, List
 
 Intersection = collections.namedtuple("Intersection", ["point", "main_factor", "other_factor"])
 
+# Geometry of a finished road, computed once by bake() for the movement code.
+# links_s/links_e are ordered by global_id and enter_s/enter_e map each link to whether
+# it is entered at its start.
+Geometry = collections.namedtuple(
+    "Geometry", ["start", "end", "unit", "length", "links_s", "links_e", "enter_s", "enter_e"])
+
+# what EntityIndex counts, see Entity.tally: live survivors (some also infected and/or panicked),
+# zombies that are up, still rising or destroyed, the remains of survivors that have turned, and
+# the uninfected live survivors that some zombie found on its last hunt
+TALLIES = ("survivors", "infected", "panicked", "zombies", "rising", "corpses", "remains", "eligible")
+
 
 class Queue:
     def __init__(self):
@@ -22,11 +34,114 @@ class Queue:
         return self.heap == []
 
 
+class EntityIndex:
+    """
+    The entities on a road, kept sorted by their distance along it so that range queries
+    are bisect windows instead of full scans. Keys are (distance, sequence) pairs so that
+    entities at the same distance keep a fixed order and can still be found by bisection.
+
+    Also keeps a count of the entities under each of TALLIES, updated as they come and go
+    and, through recount(), as they change state. Any totals dict shared between roads is
+    kept up to date alongside, giving the counts for the whole city.
+    """
+
+    def __init__(self, totals: dict = None):
+        self.keys: List[Tuple[float, int]] = []
+        self.items = []
+        self.key_of = {}
+        self.sequence = 0
+        self.counts = dict.fromkeys(TALLIES, 0)
+        self.tally_of = {}
+        self.totals = totals
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __contains__(self, entity):
+        return entity in self.key_of
+
+    def add(self, entity, along: float):
+        self.sequence += 1
+        key = (along, self.sequence)
+        i = bisect.bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.items.insert(i, entity)
+        self.key_of[entity] = key
+        self._count(entity)
+
+    def put(self, entity, key: Tuple[float, int]):
+        """ Adds an entity under a key taken from another index, e.g. when restoring a snapshot """
+        i = bisect.bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.items.insert(i, entity)
+        self.key_of[entity] = key
+        self._count(entity)
+
+    def remove(self, entity):
+        i = bisect.bisect_left(self.keys, self.key_of.pop(entity))
+        del self.keys[i]
+        del self.items[i]
+        self._uncount(self.tally_of.pop(entity))
+
+    def recount(self, entity):
+        """ Moves an entity to the counts for its current state """
+        self._uncount(self.tally_of[entity])
+        self._count(entity)
+
+    def _count(self, entity):
+        tallies = entity.tally()
+        self.tally_of[entity] = tallies
+        for tally in tallies:
+            self.counts[tally] += 1
+        if self.totals is not None:
+            for tally in tallies:
+                self.totals[tally] += 1
+
+    def _uncount(self, tallies: tuple):
+        for tally in tallies:
+            self.counts[tally] -= 1
+        if self.totals is not None:
+            for tally in tallies:
+                self.totals[tally] -= 1
+
+    def count(self, *tallies: str) -> int:
+        """ Gets the number of entities on the road under any of the given tallies """
+        return sum(self.counts[tally] for tally in tallies)
+
+    def move(self, entity, along: float):
+        """ Updates the distance along the road of an entity that is already in the index """
+        old_key = self.key_of[entity]
+        if along == old_key[0]:
+            return
+        key = (along, old_key[1])
+        i = bisect.bisect_left(self.keys, old_key)
+        if (i == 0 or self.keys[i - 1] < key) and (i == len(self.keys) - 1 or key < self.keys[i + 1]):
+            # still in order, no need to shift anything
+            self.keys[i] = key
+            self.key_of[entity] = key
+            return
+        del self.keys[i]
+        del self.items[i]
+        i = bisect.bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.items.insert(i, entity)
+        self.key_of[entity] = key
+
+    def window(self, low: float, high: float) -> list:
+        """ Gets the entities whose distance along the road is between low and high """
+        return self.items[bisect.bisect_left(self.keys, (low,)):bisect.bisect_right(self.keys, (high, math.inf))]
+
+
 class Segment:
     seg_id = 0
+    # attributes that cannot be reassigned once the road has been baked
+    BAKED_FIELDS = frozenset(("start", "end", "links_s", "links_e", "parent", "is_highway"))
 
     def __init__(self, start: Tuple[float, float], end: Tuple[float, float], is_highway: bool, time_delay: int = 0):
-        self.entities = []
+        self.entities = EntityIndex()
         self.start = start
         self.end = end
         self.is_highway = is_highway
@@ -40,9 +155,16 @@ class Segment:
         self.connected = False
 
         self.global_id = Segment.seg_id
+        self.geometry: Optional[Geometry] = None
+        self.is_baked = False
 
         Segment.seg_id += 1
 
+    def __setattr__(self, name, value):
+        if name in Segment.BAKED_FIELDS and self.__dict__.get("is_baked", False):
+            raise AttributeError("Road {} has been baked, its {} is read-only".format(self.global_id, name))
+        object.__setattr__(self, name, value)
+
     def __lt__(self, other: 'Segment'):
         return self.t < other.t
 
@@ -86,6 +208,26 @@ class Segment:
     def length(self) -> float:
         return vectors.distance(self.start, self.end)
 
+    def distance_along(self, point: Tuple[float, float]) -> float:
+        """
+        Gets how far along the road the projection of the point is, measured from the start
+        """
+        geometry = self.geometry
+        if geometry is None:
+            geometry = make_geometry(self)
+        (sx, sy), (ux, uy) = geometry.start, geometry.unit
+        return (point[0] - sx) * ux + (point[1] - sy) * uy
+
+    def bake(self):
+        """
+        Stores this road's Geometry and freezes its ends and links. Only call this once the
+        road network is finished.
+        """
+        self.links_s = frozenset(self.links_s)
+        self.links_e = frozenset(self.links_e)
+        self.geometry = make_geometry(self)
+        self.is_baked = True
+
     def dir(self) -> float:
         """ Returns this segment's angle in degrees with 3 o'clock being zero and increasing clockwise """
         angle = math.degrees(math.atan2(self.end[1] - self.start[1], self.end[0] - self.start[0]))
@@ -162,6 +304,39 @@ class Segment:
         return None
 
 
+def extent(start: Tuple[float, float], end: Tuple[float, float]) -> Tuple[Tuple[float, float], float]:
+    """ Gets the unit vector and length of the line from start to end """
+    (sx, sy), (ex, ey) = start, end
+    dx, dy = ex - sx, ey - sy
+    length = math.sqrt(dx * dx + dy * dy)
+    return ((dx / length, dy / length) if length > 0 else (0.0, 0.0)), length
+
+
+def make_geometry(road: Segment) -> Geometry:
+    unit, length = extent(road.start, road.end)
+
+    def enters(junction, links):
+        entries = {}
+        for link in links:
+            ds2 = vectors.distance2(junction, link.start)
+            de2 = vectors.distance2(junction, link.end)
+            entries[link] = ds2 < de2
+        return entries
+
+    def ordered(links):
+        return tuple(sorted(links, key=lambda l: l.global_id))
+
+    return Geometry(road.start, road.end, unit, length,
+                    ordered(road.links_s), ordered(road.links_e),
+                    enters(road.start, road.links_s), enters(road.end, road.links_e))
+
+
+def bake(all_roads: List[Segment]):
+    """ Bakes every road once generation has finished, see Segment.bake """
+    for road in all_roads:
+        road.bake()
+
+
 def angle_between(road1: Segment, road2: Segment) -> float:
     """
     Gets the smaller angle in deg formed by two connected roads.
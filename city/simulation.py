@@ -0,0 +1,208 @@
+import collections
+
+import numpy as np
+
+from typing import Dict
+
+from . import config
+from . import generation
+from . import roads
+from . import stats
+from . import trajectory
+
+from .entity import EntityList
+from .partition import PartitionedSwarm
+from .rng import RandomStreams
+from .survivor import Survivor, secondary_panic_probabilities
+from .swarm import Swarm
+from .zombie import Zombie, resolve_attacks
+
+ENGINES = ('objects', 'arrays', 'partitioned')
+
+
+class Schedule:
+    """
+    Timing wheel of items keyed by the iteration they are due, so that waiting on a timer
+    costs nothing per tick
+    """
+
+    def __init__(self):
+        self.slots = collections.defaultdict(list)
+
+    def __len__(self):
+        return sum(len(slot) for slot in self.slots.values())
+
+    def add(self, iteration: int, item):
+        self.slots[iteration].append(item)
+
+    def pop(self, iteration: int) -> list:
+        """ Takes the items due at the given iteration """
+        return self.slots.pop(iteration, [])
+
+
+class Simulation:
+    """
+    The Survivor/Zombie object simulation. Swarm offers the same step/population/sector_grid/
+    sector_counts/tracks/draw/eligible_count/has_survivors interface for the array engine.
+
+    Only zombies that are up are visited each tick. Corpses wait in a Schedule until they
+    rise, and destroyed zombies are left alone for good.
+    """
+
+    def __init__(self, city: generation.City, road_population_densities: np.ndarray = None,
+                 rng: RandomStreams = None):
+        self.city = city
+        self.iteration = 0
+        self.rng = RandomStreams() if rng is None else rng
+
+        # the roads keep these city-wide TALLIES up to date as entities come, go and change state
+        self.tallies = dict.fromkeys(roads.TALLIES, 0)
+        for road in city.roads:
+            for tally, count in road.entities.counts.items():
+                self.tallies[tally] += count
+            road.entities.totals = self.tallies
+
+        # pick every starting road in one draw rather than one weighted choice per survivor
+        if road_population_densities is None:
+            starting_roads = self.rng.spawn.generator.integers(0, len(city.roads), config.INIT_SURVIVORS)
+        else:
+            starting_roads = self.rng.spawn.generator.choice(len(city.roads), config.INIT_SURVIVORS,
+                                                             p=road_population_densities)
+        self.survivors = EntityList()
+        for road in starting_roads.tolist():
+            self.survivors.append(Survivor(city, self.rng, road=city.roads[road]))
+        self.total_infected_count = 1
+        self.total_infection_duration = 0
+        self.total_perma_corpse_count = 0
+        # the sum of every zombie's infected_count
+        self.total_bite_count = 0
+        for _ in range(0, config.INIT_INFECTED):
+            infected = Survivor(city, self.rng)
+            self.total_infection_duration += infected.infect()
+            self.survivors.append(infected)
+
+        self.zombies = EntityList()
+        self.hunters = EntityList()
+        self.rising = Schedule()
+        for _ in range(0, config.INIT_ZOMBIES):
+            self.add_zombie(Zombie(city, self.rng, init_delay=1), self.iteration)
+
+    def add_zombie(self, zombie: Zombie, first_tick: int):
+        """
+        Adds a zombie, scheduled to rise on the tick that counting down its init_delay would
+        reach zero, as Zombie.hunt does
+        :param first_tick: The first iteration that would count down its init_delay
+        """
+        self.zombies.append(zombie)
+        if zombie.is_destroyed:
+            zombie.just_destroyed = False
+            self.total_perma_corpse_count += 1
+        else:
+            self.rising.add(first_tick + zombie.init_delay - 1, zombie)
+
+    def step(self):
+        # corpses due to get up this tick do so, and join the hunt from the next tick
+        hunters = list(self.hunters)
+        for zombie in self.rising.pop(self.iteration):
+            zombie.rise()
+            self.hunters.append(zombie)
+
+        # move zombies, then resolve all their attacks together
+        for zombie in hunters:
+            zombie.stalk()
+        self.total_bite_count += resolve_attacks(hunters, self.rng)
+        for zombie in hunters:
+            if zombie.just_destroyed:
+                zombie.just_destroyed = False
+                self.total_perma_corpse_count += 1
+                self.hunters.remove(zombie)
+
+        # move survivors, then have them all react to what they can see
+        survivors = list(self.survivors)
+        for survivor in survivors:
+            survivor.wander()
+        for survivor, panic_probability in zip(survivors, secondary_panic_probabilities(survivors).tolist()):
+            survivor.react(panic_probability)
+
+        # check for new zombies and just infected
+        for survivor in list(self.survivors):
+            if not survivor.is_dead:
+                if survivor.just_infected:
+                    survivor.just_infected = False
+                    self.total_infection_duration += survivor.incubation_time_remaining
+                    self.total_infected_count += 1
+                continue
+            zombie = Zombie(self.city, self.rng, survivor.road, t=survivor.t)
+            zombie.id = survivor.id
+            is_destroyed = self.rng.infection.random() > config.ZOMBIE_RAISE_CHANCE
+            if is_destroyed:
+                zombie.destroy()
+            self.add_zombie(zombie, self.iteration + 1)
+            self.survivors.remove(survivor)
+
+        self.iteration += 1
+
+    def draw(self, screen_data):
+        """ Draws the entities in the visible sectors """
+        from .drawing import draw_entities
+        draw_entities(self.city, screen_data)
+
+    def has_survivors(self) -> bool:
+        return len(self.survivors) > 0
+
+    def population(self) -> Dict[str, int]:
+        """ The number of entities under each of roads.TALLIES """
+        return dict(self.tallies)
+
+    def sector_grid(self, cell_size: float = None) -> stats.SectorGrid:
+        return stats.get_entity_sector_grid(self.survivors, self.zombies, cell_size)
+
+    def sector_counts(self):
+        return stats.counts_from_grid(self.sector_grid())
+
+    def tracks(self) -> trajectory.Tracks:
+        """ Every survivor and zombie, for a trajectory recording """
+        road_index = {road: i for i, road in enumerate(self.city.roads)}
+        survivors, zombies = list(self.survivors), list(self.zombies)
+        entities = survivors + zombies
+        phase = np.array([trajectory.SURVIVOR] * len(survivors) +
+                         [trajectory.DESTROYED if z.is_destroyed else trajectory.CORPSE if z.init_delay > 0 else
+                          trajectory.ZOMBIE for z in zombies], dtype=np.uint8)
+        return trajectory.Tracks(np.array([e.id for e in entities], dtype=np.int64),
+                                 np.array([road_index[e.road] for e in entities], dtype=np.int32),
+                                 np.array([e.t for e in entities], dtype=np.float64),
+                                 trajectory.pack_states(phase, np.array([e.is_infected for e in entities], dtype=bool),
+                                                        np.array([e.is_panicked for e in entities], dtype=bool),
+                                                        np.array([s.speed for s in survivors] + [0.0] * len(zombies))))
+
+    def eligible_count(self):
+        """
+        The number of uninfected survivors some zombie found on its last hunt, from the running
+        eligible tally, and the mean number of bites per zombie
+        """
+        return self.tallies['eligible'], self.total_bite_count / len(self.zombies)
+
+
+def road_population_densities(city: generation.City) -> np.ndarray:
+    """ Gets the probability of each road being picked for a survivor from the population heatmap """
+    densities = np.array([city.pop.at_line(r) for r in city.roads])
+    densities /= np.sum(densities)
+    return densities
+
+
+def create(city: generation.City, engine: str = None, rng: RandomStreams = None):
+    """
+    Spawns the initial population on a generated city
+    :param engine: 'objects' for Simulation, 'arrays' for Swarm or 'partitioned' for a Swarm split over
+    config.PARTITION_WORKERS processes, config.ENTITY_ENGINE by default
+    :param rng: The run's random streams, seeded from np.random (and so the road seed) by default
+    """
+    engine = config.ENTITY_ENGINE if engine is None else engine
+    densities = road_population_densities(city)
+    if engine == 'objects':
+        return Simulation(city, densities, rng)
+    if engine == 'arrays':
+        return Swarm.from_city(city, densities, rng)
+    if engine == 'partitioned':
+        return PartitionedSwarm(Swarm.from_city(city, densities, rng))
+    raise ValueError(f'Unknown engine {engine!r}, expected one of {ENGINES}')
@@ -0,0 +1,389 @@
+"""
+Checkpoints of a running simulation: the road network, every entity and the random streams,
+in a versioned binary file that restores by memory-mapping it.
+
+    snapshot.save('outbreak.snap', sim, seed)
+    branch = snapshot.load('outbreak.snap')
+
+A restored simulation steps on exactly as the saved one would have. The file is mapped
+copy-on-write, so many branches can be loaded from one checkpoint, each changing only its
+own pages; pass each a RandomStreams of its own to make them diverge.
+
+Layout: MAGIC, then VERSION and the header length as little-endian uint32, then a JSON
+header describing the run and listing every array's dtype, shape and offset, then the
+arrays themselves, each starting on an ALIGNMENT byte boundary.
+"""
+import contextlib
+import gc
+import json
+import struct
+
+import numpy as np
+
+from typing import Dict, Tuple
+
+from . import generation
+from . import population
+from . import roads
+from . import sectors
+from . import snap_type as st
+
+from .entity import Entity, EntityList
+from .network import Network
+from .rng import RandomStreams, STREAMS
+from .simulation import Schedule, Simulation
+from .survivor import Survivor
+from .swarm import Swarm, FIELDS
+from .zombie import Zombie
+
+MAGIC = b'CITYSNAP'
+VERSION = 1
+ALIGNMENT = 64
+# how an objects snapshot keys its rising schedule: 2 by the tick a corpse rises, 1 (before
+# the version was saved) by the tick after
+RISING_VERSION = 2
+
+# Entity attributes saved as one array each for the objects engine, with their dtypes
+SHARED_ATTRIBUTES = (('id', np.int64), ('t', np.float64), ('direction', np.int8), ('is_dead', bool),
+                     ('is_panicked', bool), ('is_infected', bool), ('is_near_dead_things', bool),
+                     ('is_near_live_things', bool), ('just_infected', bool), ('panic_time_remaining', np.int32),
+                     ('panic_time_initial', np.int32))
+SURVIVOR_ATTRIBUTES = (('speed', np.float64), ('hunted_by', np.int32))
+ZOMBIE_ATTRIBUTES = (('is_destroyed', bool), ('just_destroyed', bool), ('init_delay', np.int32),
+                     ('infected_count', np.int32))
+
+
+def save(path: str, sim, seed: int = None):
+    """
+    Writes a snapshot of a Simulation or Swarm between steps
+    :param path: File to write, replacing any that is there
+    :param seed: The road seed the run started from, which runs restored from the snapshot
+    file their stats under
+    """
+    if isinstance(sim, Simulation):
+        header, arrays = _simulation_state(sim)
+    elif isinstance(sim, Swarm):
+        header, arrays = _swarm_state(sim)
+    else:
+        raise TypeError(f'Cannot snapshot a {type(sim).__name__}, expected a Simulation or Swarm')
+    header['seed'] = seed
+    header['rng'] = _rng_state(sim.rng, arrays)
+    write(path, header, arrays)
+
+
+def load(path: str, rng: RandomStreams = None):
+    """
+    Restores a snapshot written by save
+    :param rng: Random streams for the restored run, to branch off in a new direction; by
+    default the saved streams carry on where they were
+    :return: The Simulation or Swarm
+    """
+    header, arrays = read(path)
+    if 'engine' not in header:
+        raise ValueError(f'{path} is not a simulation snapshot')
+    if rng is None:
+        rng = _restore_rng(header['rng'], arrays)
+    if header['engine'] == 'objects':
+        return _restore_simulation(header, arrays, rng)
+    return _restore_swarm(header, arrays, rng)
+
+
+def describe(path: str) -> dict:
+    """
+    What a snapshot holds, without restoring it
+    :return: {'engine', 'seed', 'iteration'}, the seed being None if save was not given one
+    """
+    header, _ = read(path)
+    if 'engine' not in header:
+        raise ValueError(f'{path} is not a simulation snapshot')
+    return {'engine': header['engine'], 'seed': header.get('seed'), 'iteration': header['iteration']}
+
+
+def write(path: str, header: dict, arrays: Dict[str, np.ndarray]):
+    """ Writes a header and named arrays in the snapshot layout """
+    table = {}
+    offset = 0
+    for name, array in arrays.items():
+        table[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+    encoded = json.dumps(dict(header, arrays=table)).encode()
+
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<II', VERSION, len(encoded)))
+        file.write(encoded)
+        data_start = _aligned(file.tell())
+        for name, array in arrays.items():
+            file.seek(data_start + table[name]['offset'])
+            np.ascontiguousarray(array).tofile(file)
+
+
+def read(path: str, mode: str = 'c') -> Tuple[dict, Dict[str, np.ndarray]]:
+    """
+    Opens a file in the snapshot layout
+    :param mode: How to map the file: 'c' for copy-on-write, 'r' for read-only
+    :return: (header, arrays), the arrays being views of the mapped file
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a snapshot')
+        version, size = struct.unpack('<II', file.read(8))
+        if version != VERSION:
+            raise ValueError(f'{path} is a version {version} snapshot, expected version {VERSION}')
+        header = json.loads(file.read(size))
+    data_start = _aligned(len(MAGIC) + 8 + size)
+
+    mapped = np.memmap(path, dtype=np.uint8, mode=mode)
+    arrays = {}
+    for name, entry in header.pop('arrays').items():
+        dtype = np.dtype(entry['dtype'])
+        start = data_start + entry['offset']
+        stop = start + dtype.itemsize * int(np.prod(entry['shape']))
+        arrays[name] = mapped[start:stop].view(dtype).reshape(entry['shape'])
+    return header, arrays
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    """ Holds off the cyclic garbage collector while a lot of long-lived objects are being made """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _csr(lists) -> Tuple[np.ndarray, np.ndarray]:
+    """ Flattens a list of lists of ints into (pointers, values) """
+    pointers = np.zeros(len(lists) + 1, dtype=np.int64)
+    pointers[1:] = np.cumsum([len(values) for values in lists])
+    values = np.fromiter((value for values in lists for value in values), np.int64, int(pointers[-1]))
+    return pointers, values
+
+
+def _rng_state(rng: RandomStreams, arrays: Dict[str, np.ndarray]) -> dict:
+    for name in STREAMS:
+        arrays[f'rng.{name}.block'] = np.array(rng[name]._block, dtype=np.float64)
+    return {'seed': rng.seed, 'streams': {name: rng[name].generator.bit_generator.state for name in STREAMS}}
+
+
+def _restore_rng(state: dict, arrays: Dict[str, np.ndarray]) -> RandomStreams:
+    rng = RandomStreams(state['seed'])
+    for name in STREAMS:
+        rng[name].generator.bit_generator.state = state['streams'][name]
+        rng[name]._block = arrays[f'rng.{name}.block'].tolist()
+    return rng
+
+
+def network_arrays(network: Network, arrays: Dict[str, np.ndarray]):
+    arrays['road.start'] = network.start
+    arrays['road.end'] = network.end
+    arrays['road.link_ptr'] = network.link_ptr
+    arrays['road.link_road'] = network.link_road
+    arrays['road.link_enter_start'] = network.link_enter_start
+
+
+def restore_network(arrays: Dict[str, np.ndarray]) -> Network:
+    return Network(arrays['road.start'], arrays['road.end'], arrays['road.link_ptr'], arrays['road.link_road'],
+                   arrays['road.link_enter_start'])
+
+
+def city_state(city: generation.City, arrays: Dict[str, np.ndarray]) -> dict:
+    """
+    Adds a generated city's roads to the arrays to write, their links as CSR adjacency
+    :return: The rest of the city's state, for the header
+    """
+    index = {road: i for i, road in enumerate(city.roads)}
+    network_arrays(Network.from_roads(city.roads), arrays)
+    arrays['road.global_id'] = np.array([road.global_id for road in city.roads], dtype=np.int64)
+    arrays['road.is_highway'] = np.array([road.is_highway for road in city.roads], dtype=bool)
+    arrays['road.delay'] = np.array([road.t for road in city.roads], dtype=np.int64)
+    arrays['road.has_snapped'] = np.array([road.has_snapped for road in city.roads], dtype=np.int8)
+    arrays['road.is_branch'] = np.array([road.is_branch for road in city.roads], dtype=bool)
+    arrays['road.parent'] = np.array([index.get(road.parent, -1) for road in city.roads], dtype=np.int32)
+    # the heatmap keeps the value a road had before snapping moved its end, and the spawn densities use it
+    arrays['road.pop'] = np.array([city.pop.at_line(road) for road in city.roads], dtype=np.float64)
+    sector_roads = list(city.sectors.values())
+    arrays['sector.key'] = np.array(list(city.sectors), dtype=np.int64).reshape(-1, 2)
+    arrays['sector.ptr'], arrays['sector.road'] = _csr([[index[road] for road in in_sector]
+                                                        for in_sector in sector_roads])
+    return {'pop_seed': list(city.pop.seed), 'next_road_id': roads.Segment.seg_id}
+
+
+def restore_city(state: dict, arrays: Dict[str, np.ndarray]) -> generation.City:
+    """
+    Rebuilds the baked roads and sectors of a saved city, as generation.generate left them.
+    The roads are made baked straight from the saved links, without the checks and geometry
+    work Segment.__init__ and Segment.bake do for a road that is still being placed.
+    """
+    start = [tuple(point) for point in arrays['road.start'].tolist()]
+    end = [tuple(point) for point in arrays['road.end'].tolist()]
+    link_ptr = arrays['road.link_ptr'].tolist()
+    link_road = arrays['road.link_road'].tolist()
+    link_enter_start = arrays['road.link_enter_start'].tolist()
+    # every object made here stays alive, so the collector's passes over them would be wasted
+    with _gc_paused():
+        all_roads = [roads.Segment.__new__(roads.Segment) for _ in start]
+        for i, (road, global_id, is_highway, delay, has_snapped, is_branch, parent) in enumerate(zip(
+                all_roads, arrays['road.global_id'].tolist(), arrays['road.is_highway'].tolist(),
+                arrays['road.delay'].tolist(), arrays['road.has_snapped'].tolist(), arrays['road.is_branch'].tolist(),
+                arrays['road.parent'].tolist())):
+            # the saved links are in Geometry order, by global_id
+            s, m, e = link_ptr[2 * i], link_ptr[2 * i + 1], link_ptr[2 * i + 2]
+            links_s = tuple(all_roads[j] for j in link_road[s:m])
+            links_e = tuple(all_roads[j] for j in link_road[m:e])
+            unit, length = roads.extent(start[i], end[i])
+            road.__dict__.update(
+                entities=roads.EntityIndex(), start=start[i], end=end[i], is_highway=is_highway, t=delay,
+                has_snapped=st.SnapType(has_snapped), is_branch=is_branch,
+                parent=all_roads[parent] if parent >= 0 else None, links_s=frozenset(links_s),
+                links_e=frozenset(links_e), connected=True, global_id=global_id,
+                geometry=roads.Geometry(start[i], end[i], unit, length, links_s, links_e,
+                                        dict(zip(links_s, link_enter_start[s:m])),
+                                        dict(zip(links_e, link_enter_start[m:e]))),
+                is_baked=True)
+    roads.Segment.seg_id = state['next_road_id']
+
+    city = generation.City(all_roads, {}, population.Heatmap(tuple(state['pop_seed'])))
+    if 'road.pop' in arrays:
+        city.pop.cache.update(zip(all_roads, arrays['road.pop'].tolist()))
+    if 'sector.key' in arrays:
+        sector_ptr = arrays['sector.ptr'].tolist()
+        sector_road = arrays['sector.road'].tolist()
+        for i, sector in enumerate(arrays['sector.key'].tolist()):
+            city.sectors[tuple(sector)] = [all_roads[j] for j in sector_road[sector_ptr[i]:sector_ptr[i + 1]]]
+    else:
+        for road in all_roads:
+            sectors.add(road, city.sectors)
+    return city
+
+
+def _swarm_state(swarm: Swarm) -> Tuple[dict, Dict[str, np.ndarray]]:
+    arrays = {}
+    network_arrays(swarm.network, arrays)
+    for name, _, _ in FIELDS:
+        arrays[f'swarm.{name}'] = getattr(swarm, name)[:swarm.count]
+    arrays['swarm.nearby_hunter'], arrays['swarm.nearby_target'] = swarm.nearby
+    header = {'engine': 'arrays', 'iteration': swarm.iteration, 'count': swarm.count, 'next_id': swarm.next_id}
+    return header, arrays
+
+
+def _restore_swarm(header: dict, arrays: Dict[str, np.ndarray], rng: RandomStreams) -> Swarm:
+    # the fields stay views of the mapped file until the swarm outgrows them
+    swarm = Swarm(restore_network(arrays), 0, rng)
+    for name, _, _ in FIELDS:
+        setattr(swarm, name, arrays[f'swarm.{name}'])
+    swarm.count = swarm.capacity = header['count']
+    swarm.iteration = header['iteration']
+    swarm.next_id = header['next_id']
+    swarm.nearby = (arrays['swarm.nearby_hunter'], arrays['swarm.nearby_target'])
+    return swarm
+
+
+def _simulation_state(sim: Simulation) -> Tuple[dict, Dict[str, np.ndarray]]:
+    arrays = {}
+    header = {'engine': 'objects', 'rising_version': RISING_VERSION, 'city': city_state(sim.city, arrays)}
+
+    # every entity is on a road, the remains of turned survivors included; keeping them in road
+    # and index order keeps each road's order of entities at the same distance along it
+    road_of, entities, keys = [], [], []
+    for i, road in enumerate(sim.city.roads):
+        for entity in road.entities:
+            road_of.append(i)
+            entities.append(entity)
+            keys.append(road.entities.key_of[entity])
+    index = {entity: i for i, entity in enumerate(entities)}
+    is_zombie = [isinstance(entity, Zombie) for entity in entities]
+
+    arrays['entity.road'] = np.array(road_of, dtype=np.int32)
+    arrays['entity.is_zombie'] = np.array(is_zombie, dtype=bool)
+    arrays['entity.along'] = np.array([along for along, _ in keys], dtype=np.float64)
+    arrays['entity.sequence'] = np.array([sequence for _, sequence in keys], dtype=np.int64)
+    for name, dtype in SHARED_ATTRIBUTES:
+        arrays[f'entity.{name}'] = np.array([getattr(entity, name) for entity in entities], dtype=dtype)
+    arrays['entity.incubation_time_remaining'] = np.array(
+        [-1 if entity.incubation_time_remaining is None else entity.incubation_time_remaining
+         for entity in entities], dtype=np.int32)
+    for attributes, kind in ((SURVIVOR_ATTRIBUTES, False), (ZOMBIE_ATTRIBUTES, True)):
+        for name, dtype in attributes:
+            arrays[f'entity.{name}'] = np.array([getattr(entity, name) if zombie == kind else 0
+                                                 for entity, zombie in zip(entities, is_zombie)], dtype=dtype)
+    arrays['entity.nearby_ptr'], arrays['entity.nearby'] = _csr(
+        [[index[e] for e in entity.nearby_entities] for entity in entities])
+    arrays['entity.prey_ptr'], arrays['entity.prey'] = _csr(
+        [[index[e] for e in entity.prey] if zombie else [] for entity, zombie in zip(entities, is_zombie)])
+    arrays['road.sequence'] = np.array([road.entities.sequence for road in sim.city.roads], dtype=np.int64)
+
+    arrays['sim.survivors'] = np.array([index[e] for e in sim.survivors], dtype=np.int64)
+    arrays['sim.zombies'] = np.array([index[e] for e in sim.zombies], dtype=np.int64)
+    arrays['sim.hunters'] = np.array([index[e] for e in sim.hunters], dtype=np.int64)
+    rising = [(iteration, index[e]) for iteration, slot in sim.rising.slots.items() for e in slot]
+    arrays['sim.rising'] = np.array(rising, dtype=np.int64).reshape(-1, 2)
+
+    header.update({'iteration': sim.iteration, 'next_entity_id': Entity.current_id,
+                   'total_infected_count': sim.total_infected_count,
+                   'total_infection_duration': sim.total_infection_duration,
+                   'total_perma_corpse_count': sim.total_perma_corpse_count,
+                   'total_bite_count': sim.total_bite_count})
+    return header, arrays
+
+
+def _restore_simulation(header: dict, arrays: Dict[str, np.ndarray], rng: RandomStreams) -> Simulation:
+    rising_version = header.get('rising_version', 1)
+    if rising_version != RISING_VERSION:
+        raise ValueError(f'The snapshot keys its rising schedule by version {rising_version}, '
+                         f'expected version {RISING_VERSION}')
+    city = restore_city(header['city'], arrays)
+
+    # Simulation.__init__ would spawn a fresh population, so fill in a bare one instead
+    sim = Simulation.__new__(Simulation)
+    sim.city = city
+    sim.iteration = header['iteration']
+    sim.rng = rng
+    sim.tallies = dict.fromkeys(roads.TALLIES, 0)
+    for road in city.roads:
+        road.entities.totals = sim.tallies
+    for name in ('total_infected_count', 'total_infection_duration', 'total_perma_corpse_count',
+                 'total_bite_count'):
+        setattr(sim, name, header[name])
+
+    columns = {name: arrays[f'entity.{name}'].tolist()
+               for name, _ in SHARED_ATTRIBUTES + SURVIVOR_ATTRIBUTES + ZOMBIE_ATTRIBUTES}
+    incubation = arrays['entity.incubation_time_remaining'].tolist()
+    entities = []
+    for i, (road, is_zombie) in enumerate(zip(arrays['entity.road'].tolist(), arrays['entity.is_zombie'].tolist())):
+        entity = Zombie.__new__(Zombie) if is_zombie else Survivor.__new__(Survivor)
+        entity.rng = rng
+        entity.road = city.roads[road]
+        for name, _ in SHARED_ATTRIBUTES + (ZOMBIE_ATTRIBUTES if is_zombie else SURVIVOR_ATTRIBUTES):
+            setattr(entity, name, columns[name][i])
+        entity.incubation_time_remaining = None if incubation[i] < 0 else incubation[i]
+        if not is_zombie:
+            entity.target_entity_type = Zombie
+        entities.append(entity)
+
+    nearby_ptr, nearby = arrays['entity.nearby_ptr'].tolist(), arrays['entity.nearby'].tolist()
+    prey_ptr, prey = arrays['entity.prey_ptr'].tolist(), arrays['entity.prey'].tolist()
+    for i, entity in enumerate(entities):
+        entity.nearby_entities = [entities[j] for j in nearby[nearby_ptr[i]:nearby_ptr[i + 1]]]
+        if isinstance(entity, Zombie):
+            entity.prey = [entities[j] for j in prey[prey_ptr[i]:prey_ptr[i + 1]]]
+    for entity, along, sequence in zip(entities, arrays['entity.along'].tolist(), arrays['entity.sequence'].tolist()):
+        entity.road.entities.put(entity, (along, sequence))
+    for road, sequence in zip(city.roads, arrays['road.sequence'].tolist()):
+        road.entities.sequence = sequence
+    Entity.current_id = header['next_entity_id']
+
+    sim.survivors = EntityList(entities[i] for i in arrays['sim.survivors'].tolist())
+    sim.zombies = EntityList(entities[i] for i in arrays['sim.zombies'].tolist())
+    sim.hunters = EntityList(entities[i] for i in arrays['sim.hunters'].tolist())
+    sim.rising = Schedule()
+    for iteration, i in arrays['sim.rising'].tolist():
+        sim.rising.add(iteration, entities[i])
+    return sim
@@ -0,0 +1,160 @@
+import collections
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import columnar
+from . import config
+
+# sample the sector counts this often; assume one minute per iteration
+GATHER_INTERVAL = 12
+
+# the raw stats: one row per occupied cell per sampled iteration, cell_x and cell_y indexing cells of
+# config.STATS_CELL_SIZE (no longer the sectors of config.SECTOR_SIZE)
+RAW_COLUMNS = (('iteration', 'i4'), ('cell_x', 'i4'), ('cell_y', 'i4'), ('survivors', 'i4'),
+               ('infected', 'i4'), ('panicked', 'i4'), ('zombies', 'i4'), ('corpses', 'i4'))
+COUNT_COLUMNS = ['survivors', 'infected', 'panicked', 'zombies', 'corpses']
+
+# counts[c, i, j] is the number of entities under COUNT_COLUMNS[c] in cell (origin[0] + i, origin[1] + j)
+SectorGrid = collections.namedtuple("SectorGrid", ["origin", "counts"])
+
+
+class StatsRecorder:
+    """
+    Samples the per-sector counts during a run, streaming them to the raw stats table if given
+    one, and keeps the per-iteration totals for the summary stats
+    """
+
+    def __init__(self, gather_interval: int = GATHER_INTERVAL, raw_stats: columnar.ColumnWriter = None):
+        """
+        :param raw_stats: Where to stream the sector counts, see raw_stats_writer; without one
+        only the totals are kept
+        """
+        self.gather_interval = gather_interval
+        self.raw_stats = raw_stats
+        self.totals = []
+        self.eligible_count_per_iteration = []
+        self.r0_per_iteration = []
+        self.last_gathered_iteration = None
+
+    def gather(self, iteration: int, simulation, eligible_count: int, force: bool = False, r0: float = None):
+        """
+        Samples the simulation's sector counts if this iteration is due
+        :param force: Sample anyway unless this iteration was already sampled (end of run)
+        :param r0: The simulation's r0 estimate, kept alongside the eligible count
+        """
+        if force:
+            if self.last_gathered_iteration is not None and iteration <= self.last_gathered_iteration:
+                return
+        elif iteration % self.gather_interval != 0:
+            return
+        self.last_gathered_iteration = iteration
+
+        if self.raw_stats is not None:
+            grid = simulation.sector_grid()
+            cell_x, cell_y, counts = occupied_cells(grid)
+            self.raw_stats.append(np.full(len(cell_x), iteration, dtype=np.int32), cell_x, cell_y, *counts)
+            self.totals.append([iteration] + grid.counts.sum(axis=(1, 2)).tolist())
+        else:
+            # without the sector rows to write, the running population counts are all that is needed
+            population = simulation.population()
+            self.totals.append([iteration, population['survivors'], population['infected'], population['panicked'],
+                                population['zombies'] + population['rising'], population['corpses']])
+        self.eligible_count_per_iteration.append(eligible_count)
+        self.r0_per_iteration.append(r0)
+
+    def summary(self) -> pd.DataFrame:
+        """ The sampled sector counts summed per iteration, with the eligible count """
+        summary_stats_df = pd.DataFrame(self.totals, columns=['iteration'] + COUNT_COLUMNS).set_index('iteration')
+        summary_stats_df['eligible'] = self.eligible_count_per_iteration
+        return summary_stats_df
+
+    def write(self, seed, data_dir: str = 'data') -> pd.DataFrame:
+        """
+        Finishes the raw stats table and writes summary_stats_<seed> as pickle and csv
+        :return: The summary stats
+        """
+        if self.raw_stats is not None:
+            self.raw_stats.close()
+        summary_stats_df = self.summary()
+
+        summary_stats_df.to_pickle(os.path.join(data_dir, f'summary_stats_{seed}.pk'))
+        summary_stats_df.to_csv(os.path.join(data_dir, f'summary_stats_{seed}.csv'))
+
+        return summary_stats_df
+
+
+def raw_stats_writer(seed, data_dir: str = 'data') -> columnar.ColumnWriter:
+    """ Starts the raw_stats_<seed> table for a StatsRecorder to stream to """
+    return columnar.ColumnWriter(os.path.join(data_dir, f'raw_stats_{seed}'), RAW_COLUMNS)
+
+
+def read_raw_stats(seed, data_dir: str = 'data', mmap: bool = True) -> pd.DataFrame:
+    """
+    Loads a raw_stats_<seed> table, including one still being written or cut short
+    :param mmap: Back the columns with memory maps of the files where pandas allows
+    """
+    return pd.DataFrame(columnar.read_columns(os.path.join(data_dir, f'raw_stats_{seed}'), mmap), copy=False)
+
+
+def sector_histogram(x: np.ndarray, y: np.ndarray, columns: np.ndarray, cell_size: float = None) -> SectorGrid:
+    """
+    Counts entities per grid cell in one pass
+    :param x: World x of each entity
+    :param y: World y of each entity
+    :param columns: (len(COUNT_COLUMNS), entities) bools, whether each entity counts under each column
+    :param cell_size: config.STATS_CELL_SIZE by default
+    :return: The counts over the smallest grid holding every entity
+    """
+    cell_size = config.STATS_CELL_SIZE if cell_size is None else cell_size
+    if len(x) == 0:
+        return SectorGrid((0, 0), np.zeros((len(columns), 0, 0), dtype=np.int64))
+    cell_x = np.floor_divide(x, cell_size).astype(np.int64)
+    cell_y = np.floor_divide(y, cell_size).astype(np.int64)
+    x0, y0 = cell_x.min(), cell_y.min()
+    width, height = int(cell_x.max() - x0) + 1, int(cell_y.max() - y0) + 1
+    cell = (cell_x - x0) * height + (cell_y - y0)
+    counts = np.stack([np.bincount(cell[column], minlength=width * height) for column in columns])
+    return SectorGrid((int(x0), int(y0)), counts.reshape(len(columns), width, height))
+
+
+def merge_grids(grids) -> SectorGrid:
+    """ Adds up grids of the same cell size """
+    grids = [grid for grid in grids if grid.counts.size]
+    if not grids:
+        return SectorGrid((0, 0), np.zeros((len(COUNT_COLUMNS), 0, 0), dtype=np.int64))
+    x0 = min(grid.origin[0] for grid in grids)
+    y0 = min(grid.origin[1] for grid in grids)
+    width = max(grid.origin[0] + grid.counts.shape[1] for grid in grids) - x0
+    height = max(grid.origin[1] + grid.counts.shape[2] for grid in grids) - y0
+    counts = np.zeros((grids[0].counts.shape[0], width, height), dtype=np.int64)
+    for (x, y), grid_counts in grids:
+        counts[:, x - x0:x - x0 + grid_counts.shape[1], y - y0:y - y0 + grid_counts.shape[2]] += grid_counts
+    return SectorGrid((x0, y0), counts)
+
+
+def occupied_cells(grid: SectorGrid):
+    """ :return: (cell x, cell y, counts per column) of the cells with anything in them, in x then y order """
+    i, j = np.nonzero(grid.counts.any(axis=0))
+    return i + grid.origin[0], j + grid.origin[1], grid.counts[:, i, j]
+
+
+def counts_from_grid(grid: SectorGrid):
+    """ The grid of a sector_histogram as {sector: (survivors, infected, panicked, zombies, corpses)} """
+    cell_x, cell_y, counts = occupied_cells(grid)
+    return {(x, y): tuple(c) for x, y, c in zip(cell_x.tolist(), cell_y.tolist(), counts.T.tolist())}
+
+
+def get_entity_sector_grid(survivors, zombies, cell_size: float = None) -> SectorGrid:
+    """ The sector_histogram of the Survivor and Zombie objects """
+    survivors, zombies = list(survivors), list(zombies)
+    n_survivors, n = len(survivors), len(survivors) + len(zombies)
+    x, y = np.array([entity.position() for entity in survivors + zombies], dtype=np.float64).reshape(n, 2).T
+    columns = np.zeros((len(COUNT_COLUMNS), n), dtype=bool)
+    columns[0, :n_survivors] = True
+    columns[1, :n_survivors] = [survivor.is_infected for survivor in survivors]
+    columns[2, :n_survivors] = [survivor.is_panicked for survivor in survivors]
+    columns[4, n_survivors:] = [zombie.is_destroyed for zombie in zombies]
+    columns[3, n_survivors:] = ~columns[4, n_survivors:]
+    return sector_histogram(x, y, columns, cell_size)
@@ -1,16 +1,22 @@
 from . import config
-from .drawing import ScreenData, draw_survivor, draw_label_world
 from .entity import Entity
 
-import random
+from typing import List, TYPE_CHECKING
 
-from .vectors import distance
+import numpy as np
+
+from .network import ranges
 from .zombie import Zombie
 
+if TYPE_CHECKING:
+    from .drawing import ScreenData
+
 
 class Survivor(Entity):
-    def __init__(self, city, road=None, x=None, y=None, road_population_densities=None):
-        super().__init__(city, road=road, x=x, y=y, road_population_densities=road_population_densities)
+    def __init__(self, city, rng, road=None, x=None, y=None, road_population_densities=None, t=None):
+        # set before joining the road, which counts the survivor by it
+        self.hunted_by = 0
+        super().__init__(city, rng, road=road, x=x, y=y, road_population_densities=road_population_densities, t=t)
         self.is_dead = False
         self.incubation_time_remaining = None
         self.panic_time_remaining = 0
@@ -21,25 +27,54 @@ class Survivor(Entity):
         self.target_entity_type = Zombie
 
     def infect(self, incubation_time=None):
-        self.is_infected = True
+        if not self.is_infected:
+            self.is_infected = True
+            self.road.entities.recount(self)
 
         if incubation_time is not None:
             self.incubation_time_remaining = max(1, incubation_time)
         else:
-            itr = random.randint(0, config.INFECTED_INCUBATION_MAX_TIME)
+            itr = self.rng.infection.randint(0, config.INFECTED_INCUBATION_MAX_TIME)
             itr = itr if self.incubation_time_remaining is None else min(itr, self.incubation_time_remaining)
             self.incubation_time_remaining = itr
 
         self.just_infected = True
         return self.incubation_time_remaining
 
-    def draw(self, screen_data: ScreenData):
+    def tally(self) -> tuple:
+        if self.is_dead:
+            return 'remains',
+        return (('survivors',) + (('infected',) if self.is_infected else ('eligible',) if self.hunted_by else ()) +
+                (('panicked',) if self.is_panicked else ()))
+
+    def hunted(self, by: int):
+        """ Adds to the number of zombies whose last hunt found this survivor, see Zombie.track_prey """
+        was_hunted = self.hunted_by > 0
+        self.hunted_by += by
+        if (self.hunted_by > 0) != was_hunted:
+            self.road.entities.recount(self)
+
+    def color(self):
+        if self.is_dead:
+            # the zombie that rose from these remains is drawn instead
+            return None
+        from .drawing import survivor_color
+        return survivor_color(self.is_infected, (self.speed / config.SURVIVOR_SPEED) - 1)
+
+    def draw(self, screen_data: 'ScreenData'):
+        from .drawing import draw_survivor
         sf = (self.speed / config.SURVIVOR_SPEED) - 1
-        draw_survivor(self.x, self.y, screen_data, self.is_infected, sf)
+        x, y = self.position()
+        draw_survivor(x, y, screen_data, self.is_infected, sf)
         # if self.near_dead_things:
         #      draw_label_world((f"{self.id}", (self.x + 10, self.y)), screen_data, 1)
 
     def move(self):
+        self.wander()
+        self.react()
+
+    def wander(self):
+        """ The first half of a move: walk along the road, noting what is nearby """
         towards_higher_density = None
         target_entity_type = None
 
@@ -59,7 +94,13 @@ class Survivor(Entity):
                            target_entity_type=target_entity_type,
                            target_follow_probability=config.SURVIVOR_TARGET_FOLLOW_PROBABILITY)
 
-        self.__check_for_panic()
+    def react(self, secondary_panic_probability: float = None):
+        """
+        The second half of a move: panic at what was seen, then update speed and incubation
+        :param secondary_panic_probability: This survivor's entry from secondary_panic_probabilities,
+        worked out here if not given
+        """
+        self.__check_for_panic(secondary_panic_probability)
 
         speed_boost = 0
         if self.is_panicked:
@@ -71,21 +112,24 @@ class Survivor(Entity):
         if self.incubation_time_remaining is not None:
             if self.incubation_time_remaining > 0:
                 self.incubation_time_remaining -= 1
-            if self.incubation_time_remaining <= 0:
+            if self.incubation_time_remaining <= 0 and not self.is_dead:
                 self.is_dead = True
+                self.road.entities.recount(self)
 
-    def __check_for_panic(self):
+    def __check_for_panic(self, secondary_panic_probability: float = None):
         # check for scary things nearby
         if not self.is_panicked:
             panic_time = 0
 
             if self.is_near_dead_things:
                 panic_probability = config.SURVIVOR_SEES_DEATH_PANIC_PROBABILITY
+            elif secondary_panic_probability is not None:
+                panic_probability = secondary_panic_probability
             else:
                 panic_probability = self.__check_for_secondary_panic()
 
-            if random.random() < panic_probability:
-                panic_time = random.randint(0, config.SURVIVOR_PANIC_DURATION)
+            if self.rng.panic.random() < panic_probability:
+                panic_time = self.rng.panic.randint(0, config.SURVIVOR_PANIC_DURATION)
 
             if panic_time > 0:
                 if self.is_infected:
@@ -98,26 +142,69 @@ class Survivor(Entity):
         if self.panic_time_remaining > 0:
             self.panic_time_remaining -= 1
 
-        self.is_panicked = self.panic_time_remaining > 0
+        is_panicked = self.panic_time_remaining > 0
+        if is_panicked != self.is_panicked:
+            self.is_panicked = is_panicked
+            self.road.entities.recount(self)
 
     def __check_for_secondary_panic(self):
         panic_probability = 0
-        for entity in self.road.entities:
+        for entity in self.road.entities.window(self.t - config.SURVIVOR_PANIC_RANGE,
+                                                self.t + config.SURVIVOR_PANIC_RANGE):
             if self == entity or entity.is_dead:
                 continue
-            if distance((self.x, self.y), (entity.x, entity.y)) >= config.SURVIVOR_PANIC_RANGE:
+            # both are on this road, so the distance between them is the difference along it
+            if abs(entity.t - self.t) >= config.SURVIVOR_PANIC_RANGE:
                 continue
-            pp = 0
-            if entity.is_infected:
-                # if it's infected, use the secondary panic probability, modified by closeness to death
-                pp = (config.SURVIVOR_SEES_PANICKED_OR_INFECTED_PANIC_PROBABILITY *
-                      (1 - float(entity.incubation_time_remaining /
-                                 config.INFECTED_INCUBATION_MAX_TIME)))
-            elif entity.is_panicked:
-                # if it's infected, use the secondary panic probability, modified by how panicked
-                pp = (config.SURVIVOR_SEES_PANICKED_OR_INFECTED_PANIC_PROBABILITY *
-                      float(entity.panic_time_remaining / config.SURVIVOR_PANIC_DURATION))
+            pp = entity.panic_given_off()
             if pp > panic_probability:
                 panic_probability = pp
         return panic_probability
 
+    def panic_given_off(self) -> float:
+        """ The chance of this survivor panicking a calm survivor who sees it """
+        if self.is_infected:
+            # if it's infected, use the secondary panic probability, modified by closeness to death
+            return (config.SURVIVOR_SEES_PANICKED_OR_INFECTED_PANIC_PROBABILITY *
+                    (1 - float(self.incubation_time_remaining /
+                               config.INFECTED_INCUBATION_MAX_TIME)))
+        if self.is_panicked:
+            # if it's panicked, use the secondary panic probability, modified by how panicked
+            return (config.SURVIVOR_SEES_PANICKED_OR_INFECTED_PANIC_PROBABILITY *
+                    float(self.panic_time_remaining / config.SURVIVOR_PANIC_DURATION))
+        return 0
+
+
+def secondary_panic_probabilities(survivors: List[Survivor]) -> np.ndarray:
+    """
+    The secondary panic check for a whole population in one pass: for each survivor, the
+    highest panic given off by another live survivor on its road within SURVIVOR_PANIC_RANGE
+    :return: One probability per survivor, in the order given
+    """
+    n = len(survivors)
+    panic = np.zeros(n)
+    if n == 0:
+        return panic
+    road = np.fromiter((s.road.global_id for s in survivors), np.int64, n)
+    t = np.fromiter((s.t for s in survivors), np.float64, n)
+    given_off = np.fromiter((0 if s.is_dead else s.panic_given_off() for s in survivors), np.float64, n)
+
+    # only the infected and panicked give off panic, so search just those, sorted by (road, t)
+    source = np.flatnonzero(given_off > 0)
+    if len(source) == 0:
+        return panic
+    panic_range = config.SURVIVOR_PANIC_RANGE
+    stride = float(t.max()) + 2 * panic_range + 1
+    keys = road[source] * stride + t[source]
+    order = np.argsort(keys)
+    keys = keys[order]
+    source = source[order]
+
+    along = road * stride + t
+    lo = np.searchsorted(keys, along - panic_range, 'left')
+    counts = np.searchsorted(keys, along + panic_range, 'right') - lo
+    seer = np.repeat(np.arange(n), counts)
+    seen = source[ranges(lo, counts)]
+    near = (seer != seen) & (np.abs(t[seen] - t[seer]) < panic_range)
+    np.maximum.at(panic, seer[near], given_off[seen[near]])
+    return panic
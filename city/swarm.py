@@ -0,0 +1,522 @@
+import numpy as np
+
+from typing import Dict, Tuple
+
+from . import config
+from . import roads
+from . import stats
+from . import trajectory
+from .network import Network, ranges
+from .rng import RandomStreams
+
+# values of Swarm.kind
+SURVIVOR = 0
+ZOMBIE = 1
+# a dead survivor stays where it fell, like the Survivor object left in road.entities
+REMAINS = 2
+
+# name, dtype and initial value of every per-entity array
+FIELDS = (
+    ('id', np.int64, 0),
+    ('kind', np.int8, SURVIVOR),
+    ('road', np.int32, 0),
+    ('pos', np.float64, 0.0),
+    ('direction', np.int8, 1),
+    ('speed', np.float64, 0.0),
+    ('is_dead', bool, False),
+    ('is_infected', bool, False),
+    ('is_panicked', bool, False),
+    ('is_destroyed', bool, False),
+    ('is_near_live_things', bool, False),
+    # -1 stands in for Survivor.incubation_time_remaining being None
+    ('incubation_time_remaining', np.int32, -1),
+    ('panic_time_remaining', np.int32, 0),
+    ('panic_time_initial', np.int32, 0),
+    ('init_delay', np.int32, 0),
+    ('infected_count', np.int32, 0),
+    # a read-only copy of an entity owned by another partition, see partition.py
+    ('is_ghost', bool, False),
+)
+
+# the keyed draws each stream makes per entity per tick; a link's tie-break is LINK_TIE + its slot
+DRAW_DIRECTION, DRAW_INIT_DELAY = 0, 1
+DRAW_FLIP, DRAW_FOLLOW, DRAW_LINK_TIE = 0, 1, 2
+DRAW_PANIC, DRAW_PANIC_TIME = 0, 1
+DRAW_BITE, DRAW_DESTROY, DRAW_INCUBATION, DRAW_RAISE = 0, 1, 2, 3
+
+
+class Swarm:
+    """
+    Structure-of-arrays version of the Survivor/Zombie simulation. Every entity is a slot in
+    the arrays named in FIELDS, positioned by its road index and distance along that road,
+    and each step advances the whole population with array operations.
+
+    Every per-entity random decision is a keyed draw on the entity's id and the iteration,
+    so the outcome does not depend on where the entity sits in the arrays.
+    """
+
+    def __init__(self, network: Network, capacity: int = 1024, rng: RandomStreams = None):
+        self.network = network
+        self.rng = RandomStreams() if rng is None else rng
+        self.count = 0
+        self.capacity = 0
+        self.iteration = 0
+        self.next_id = 1
+        for name, dtype, _ in FIELDS:
+            setattr(self, name, np.zeros(0, dtype=dtype))
+        # (zombie, survivor) pairs from the last hunt, as kept in Zombie.nearby_entities
+        self.nearby = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        # entities per road for picking the least crowded link, counted from the arrays when None;
+        # a partition is given the count over every partition instead, see partition.py
+        self.crowding = None
+        self._reserve(capacity)
+
+    @classmethod
+    def from_city(cls, city, road_population_densities: np.ndarray = None, rng: RandomStreams = None) -> 'Swarm':
+        """
+        Spawns the initial population the same way city_generator.main does
+        :param city: A generated city
+        :param road_population_densities: Probability of each road being picked for a survivor
+        :param rng: The run's random streams, seeded from np.random by default
+        :return: The populated swarm
+        """
+        return cls.from_network(Network.from_roads(city.roads), road_population_densities, rng)
+
+    @classmethod
+    def from_network(cls, network: Network, road_population_densities: np.ndarray = None,
+                     rng: RandomStreams = None) -> 'Swarm':
+        """ Same as from_city, on the road network of a city """
+        swarm = cls(network, config.INIT_ZOMBIES + config.INIT_INFECTED + 2 * config.INIT_SURVIVORS, rng)
+        swarm.spawn_survivors(config.INIT_SURVIVORS, road_population_densities)
+        infected = swarm.spawn_survivors(config.INIT_INFECTED)
+        swarm.infect(infected)
+        swarm.spawn_zombies(config.INIT_ZOMBIES, init_delay=1)
+        return swarm
+
+    def _reserve(self, extra: int):
+        needed = self.count + extra
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, 2 * self.capacity)
+        for name, dtype, initial in FIELDS:
+            grown = np.full(capacity, initial, dtype=dtype)
+            grown[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, grown)
+        self.capacity = capacity
+
+    def add(self, kind: int, road: np.ndarray, pos: np.ndarray, ids: np.ndarray = None) -> np.ndarray:
+        """
+        Adds entities at the given road positions facing a random direction
+        :param ids: Ids to give the new entities, fresh ones by default
+        :return: The indices of the new entities
+        """
+        n = len(road)
+        self._reserve(n)
+        idx = np.arange(self.count, self.count + n)
+        self.count += n
+
+        if ids is None:
+            ids = np.arange(self.next_id, self.next_id + n)
+            self.next_id += n
+        self.id[idx] = ids
+        self.kind[idx] = kind
+        self.road[idx] = road
+        self.pos[idx] = pos
+        facing = self.rng.spawn.uniform(ids, self.iteration, DRAW_DIRECTION)
+        self.direction[idx] = np.where(facing > 0.5, 1, -1)
+        return idx
+
+    def take(self, idx: np.ndarray) -> Dict[str, np.ndarray]:
+        """ Copies the state of the given entities, as a dict of arrays keyed by field name """
+        return {name: getattr(self, name)[idx].copy() for name, _, _ in FIELDS}
+
+    def put(self, state: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Appends entities copied with take
+        :return: The indices of the new entities
+        """
+        n = len(state['id'])
+        self._reserve(n)
+        idx = np.arange(self.count, self.count + n)
+        self.count += n
+        for name, _, _ in FIELDS:
+            getattr(self, name)[idx] = state[name]
+        return idx
+
+    def remove(self, idx: np.ndarray):
+        """ Removes entities, keeping the remaining ones in order """
+        n = self.count
+        keep = np.ones(n, dtype=bool)
+        keep[idx] = False
+        kept = np.flatnonzero(keep)
+        # add() expects the slots past count to hold their initial values
+        for name, _, initial in FIELDS:
+            array = getattr(self, name)
+            array[:len(kept)] = array[kept]
+            array[len(kept):n] = initial
+        self.count = len(kept)
+
+        new_index = np.cumsum(keep) - 1
+        hunter, target = self.nearby
+        paired = keep[hunter] & keep[target]
+        self.nearby = (new_index[hunter[paired]], new_index[target[paired]])
+
+    def spawn_survivors(self, n: int, road_population_densities: np.ndarray = None) -> np.ndarray:
+        road = self._random_roads(n, road_population_densities)
+        idx = self.add(SURVIVOR, road, self.rng.spawn.array(n) * self.network.length[road])
+        self.speed[idx] = config.SURVIVOR_SPEED
+        return idx
+
+    def spawn_zombies(self, n: int, init_delay: int = None) -> np.ndarray:
+        road = self._random_roads(n)
+        idx = self.add(ZOMBIE, road, self.rng.spawn.array(n) * self.network.length[road])
+        self._make_zombies(idx, init_delay)
+        return idx
+
+    def _random_roads(self, n: int, road_population_densities: np.ndarray = None) -> np.ndarray:
+        if road_population_densities is None:
+            return self.rng.spawn.generator.integers(0, len(self.network), n)
+        return self.rng.spawn.generator.choice(len(self.network), n, p=road_population_densities)
+
+    def _make_zombies(self, idx: np.ndarray, init_delay: int = None):
+        if init_delay is None:
+            self.init_delay[idx] = self.rng.spawn.integers(1, config.ZOMBIE_RAISE_DELAY + 1, self.id[idx],
+                                                           self.iteration, DRAW_INIT_DELAY)
+        else:
+            self.init_delay[idx] = max(init_delay, 1)
+        self.is_dead[idx] = True
+        self.is_infected[idx] = True
+
+    def infect(self, idx: np.ndarray):
+        """ Survivor.infect for each index; repeated indices keep the shortest incubation """
+        itr = self.rng.infection.integers(0, config.INFECTED_INCUBATION_MAX_TIME + 1, self.id[idx],
+                                          self.iteration, DRAW_INCUBATION)
+        current = self.incubation_time_remaining[idx]
+        self.incubation_time_remaining[idx] = np.where(current >= 0, current,
+                                                       config.INFECTED_INCUBATION_MAX_TIME + 1)
+        np.minimum.at(self.incubation_time_remaining, idx, itr)
+        self.is_infected[idx] = True
+
+    def xy(self, idx: np.ndarray):
+        return self.network.point_at(self.road[idx], self.pos[idx])
+
+    def step(self):
+        """ Advances every entity by one tick: zombies, then survivors, then the newly dead rise """
+        self.step_zombies()
+        self.step_survivors()
+
+    def step_zombies(self):
+        """ The first half of a step, which a partition runs on its own to share the result before the second """
+        self._move_zombies()
+
+    def step_survivors(self):
+        """ The second half of a step """
+        self._move_survivors()
+        self._raise_dead()
+        self.iteration += 1
+
+    def _move_zombies(self):
+        n = self.count
+        zombies = np.flatnonzero((self.kind[:n] == ZOMBIE) & ~self.is_destroyed[:n] & ~self.is_ghost[:n])
+        rising = self.init_delay[zombies] > 0
+        self.init_delay[zombies[rising]] -= 1
+        idx = zombies[~rising]
+
+        speed = np.where(self.is_near_live_things[idx], config.ZOMBIE_HUNT_SPEED, config.ZOMBIE_SPEED)
+        end = self._advance(idx, speed, config.ZOMBIE_WANDER_DIRECTION_CHANGE_PROBABILITY)
+
+        live = np.flatnonzero(~self.is_dead[:n])
+        qi, target, _ = self._nearby(idx, end, live, config.ZOMBIE_HUNT_RANGE)
+        self.is_near_live_things[idx] = False
+        self.is_near_live_things[idx[qi]] = True
+
+        self._change_roads(idx, end, np.ones(len(idx), dtype=bool),
+                           config.ZOMBIE_TARGET_FOLLOW_PROBABILITY)
+
+        hunter = idx[qi]
+        self._attack(hunter, target)
+        kept = ~self.is_destroyed[hunter]
+        self.nearby = (hunter[kept], target[kept])
+
+    def _move_survivors(self):
+        n = self.count
+        # ghosts are moved too, as the owned survivors see them where their owner moves them to,
+        # but are left alone after that
+        moving = np.flatnonzero((self.kind[:n] == SURVIVOR) & ~self.is_dead[:n])
+        end = self._advance(moving, self.speed[moving], config.SURVIVOR_WANDER_DIRECTION_CHANGE_PROBABILITY)
+        owned = ~self.is_ghost[moving]
+        idx, end = moving[owned], end[owned]
+
+        qi, target, searched = self._nearby(idx, end, np.arange(n), config.SURVIVOR_PANIC_RANGE)
+        survivor = idx[qi]
+        dead = self.is_dead[target]
+
+        near_dead = np.zeros(len(idx), dtype=bool)
+        near_dead[qi[dead]] = True
+        # live entities avoid links with anything dead near the junction
+        ignore = dead & (searched != self.road[survivor])
+        ignored = np.unique(survivor[ignore].astype(np.int64) * len(self.network) + searched[ignore])
+
+        # secondary panic from the other live entities on the survivor's own road
+        seen = ~dead & (target != survivor) & (searched == self.road[survivor])
+        seen_qi, seen = qi[seen], target[seen]
+        pp = np.where(self.is_infected[seen],
+                      config.SURVIVOR_SEES_PANICKED_OR_INFECTED_PANIC_PROBABILITY *
+                      (1 - self.incubation_time_remaining[seen] / config.INFECTED_INCUBATION_MAX_TIME),
+                      np.where(self.is_panicked[seen],
+                               config.SURVIVOR_SEES_PANICKED_OR_INFECTED_PANIC_PROBABILITY *
+                               self.panic_time_remaining[seen] / config.SURVIVOR_PANIC_DURATION,
+                               0.0))
+        secondary = np.zeros(len(idx))
+        np.maximum.at(secondary, seen_qi, pp)
+
+        biased = self.is_infected[idx] | self.is_panicked[idx]
+        self._change_roads(idx, end, biased, config.SURVIVOR_TARGET_FOLLOW_PROBABILITY, ignored)
+
+        self._check_for_panic(idx, np.where(near_dead, config.SURVIVOR_SEES_DEATH_PANIC_PROBABILITY, secondary))
+
+        speed_boost = np.zeros(len(idx))
+        panicked = self.is_panicked[idx]
+        p = idx[panicked]
+        speed_boost[panicked] = ((config.SURVIVOR_PANIC_SPEED - config.SURVIVOR_SPEED) *
+                                 self.panic_time_remaining[p] / self.panic_time_initial[p])
+        self.speed[idx] = config.SURVIVOR_SPEED + speed_boost
+
+        incubating = idx[self.incubation_time_remaining[idx] >= 0]
+        itr = self.incubation_time_remaining[incubating]
+        itr = np.where(itr > 0, itr - 1, itr)
+        self.incubation_time_remaining[incubating] = itr
+        self.is_dead[incubating[itr <= 0]] = True
+
+    def _check_for_panic(self, idx: np.ndarray, panic_probability: np.ndarray):
+        calm = ~self.is_panicked[idx]
+        ids = self.id[idx]
+        panic_time = self.rng.panic.integers(0, config.SURVIVOR_PANIC_DURATION + 1, ids, self.iteration,
+                                             DRAW_PANIC_TIME)
+        panic_time[~(calm & (self.rng.panic.uniform(ids, self.iteration, DRAW_PANIC) < panic_probability))] = 0
+        panic_time = np.where(self.is_infected[idx],
+                              panic_time * int(round(config.INFECTED_PANIC_TIME_MULTIPLIER)), panic_time)
+        start = (panic_time > 0) & (self.panic_time_remaining[idx] == 0)
+        s = idx[start]
+        self.direction[s] = -self.direction[s]
+        self.panic_time_remaining[s] = panic_time[start]
+        self.panic_time_initial[s] = panic_time[start]
+
+        remaining = self.panic_time_remaining[idx]
+        remaining = np.where(remaining > 0, remaining - 1, remaining)
+        self.panic_time_remaining[idx] = remaining
+        self.is_panicked[idx] = remaining > 0
+
+    def _raise_dead(self):
+        n = self.count
+        fallen = np.flatnonzero((self.kind[:n] == SURVIVOR) & self.is_dead[:n] & ~self.is_ghost[:n])
+        if len(fallen) == 0:
+            return
+        self.kind[fallen] = REMAINS
+        risen = self.add(ZOMBIE, self.road[fallen], self.pos[fallen], self.id[fallen])
+        self._make_zombies(risen)
+        raised = self.rng.infection.uniform(self.id[risen], self.iteration, DRAW_RAISE)
+        self.is_destroyed[risen] = raised > config.ZOMBIE_RAISE_CHANCE
+
+    def _advance(self, idx: np.ndarray, speed: np.ndarray, direction_change_probability: float) -> np.ndarray:
+        """
+        Moves entities along their roads, as the first half of Entity.random_wander
+        :return: Per entity, -1 if it is still on its road, 0 if it ran off the start, 1 if off the end
+        """
+        pos = self.pos[idx] + self.direction[idx] * speed
+        self.pos[idx] = pos
+        end = np.full(len(idx), -1, dtype=np.int8)
+        end[pos <= 0] = 0
+        end[pos >= self.network.length[self.road[idx]]] = 1
+
+        flip = (end < 0) & (self.rng.movement.uniform(self.id[idx], self.iteration, DRAW_FLIP) <
+                            direction_change_probability)
+        self.direction[idx[flip]] = -self.direction[idx[flip]]
+        return end
+
+    def _nearby(self, idx: np.ndarray, end: np.ndarray, targets: np.ndarray, entity_check_range: float):
+        """
+        Finds the targets within range of each entity on its own road, plus the links at the end
+        it ran off
+        :return: (qi, target, searched) for every pair found, where qi indexes idx and searched
+        is the road the target was found on
+        """
+        net = self.network
+        empty = np.zeros(0, dtype=np.int64)
+        if len(idx) == 0 or len(targets) == 0:
+            return empty, empty, empty
+
+        changing = np.flatnonzero(end >= 0)
+        owner, flat = net.links(self.road[idx[changing]], end[changing])
+        req_i = np.concatenate([np.arange(len(idx)), changing[owner]])
+        req_road = np.concatenate([self.road[idx], net.link_road[flat]]).astype(np.int64)
+
+        # targets sorted by (road, distance along road) so each request is a contiguous window
+        stride = float(net.length.max()) + 2 * entity_check_range + 1
+        target_road = self.road[targets].astype(np.int64)
+        keys = target_road * stride + np.clip(self.pos[targets], 0, net.length[target_road])
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        targets = targets[order]
+
+        qx, qy = self.xy(idx[req_i])
+        along = ((qx - net.start[req_road, 0]) * net.unit[req_road, 0] +
+                 (qy - net.start[req_road, 1]) * net.unit[req_road, 1])
+        along = np.clip(along, 0, net.length[req_road]) + req_road * stride
+        lo = np.searchsorted(keys, along - entity_check_range, 'left')
+        hi = np.searchsorted(keys, along + entity_check_range, 'right')
+
+        counts = hi - lo
+        pair_req = np.repeat(np.arange(len(req_i)), counts)
+        target = targets[ranges(lo, counts)]
+        tx, ty = self.xy(target)
+        d = np.hypot(tx - qx[pair_req], ty - qy[pair_req])
+        keep = d < entity_check_range
+        pair_req = pair_req[keep]
+        return req_i[pair_req], target[keep], req_road[pair_req]
+
+    def _change_roads(self, idx: np.ndarray, end: np.ndarray, biased: np.ndarray,
+                      target_follow_probability: float, ignored: np.ndarray = None):
+        """
+        Moves entities that ran off their road onto a link, as the second half of
+        Entity.random_wander. Entities with no usable link turn around instead.
+        :param biased: Whether each entity may pick the least crowded link instead of a random one
+        :param ignored: Sorted entity * len(network) + road keys of links to avoid
+        """
+        net = self.network
+        changing = np.flatnonzero(end >= 0)
+        if len(changing) == 0:
+            return
+        movers = idx[changing]
+        owner, flat = net.links(self.road[movers], end[changing])
+        link = net.link_road[flat]
+
+        valid = np.ones(len(flat), dtype=bool)
+        if ignored is not None and len(ignored):
+            valid = ~np.isin(movers[owner].astype(np.int64) * len(net) + link, ignored)
+
+        follow = self.rng.movement.uniform(self.id[movers], self.iteration, DRAW_FOLLOW) < target_follow_probability
+        crowding = self.crowding
+        if crowding is None:
+            crowding = np.bincount(self.road[:self.count], minlength=len(net))
+        score = np.where((biased[changing] & ~follow)[owner], crowding[link], 0)
+
+        # per mover, a random usable link among those with the lowest score
+        slot = np.arange(len(flat)) - np.searchsorted(owner, owner)
+        tie = self.rng.movement.uniform(self.id[movers[owner]], self.iteration, DRAW_LINK_TIE + slot)
+        order = np.lexsort((tie, score, ~valid, owner))
+        first = order[np.r_[True, owner[order][1:] != owner[order][:-1]]] if len(order) else order
+        first = first[valid[first]]
+
+        chosen = np.zeros(len(changing), dtype=bool)
+        chosen[owner[first]] = True
+        moved = movers[owner[first]]
+        self.road[moved] = link[first]
+        enter_start = net.link_enter_start[flat[first]]
+        self.pos[moved] = np.where(enter_start, 0.0, net.length[link[first]])
+        self.direction[moved] = np.where(enter_start, 1, -1)
+
+        # dead ends: stay put at the end of the current road
+        stuck = movers[~chosen]
+        at_start = end[changing][~chosen] == 0
+        self.pos[stuck] = np.where(at_start, 0.0, net.length[self.road[stuck]])
+        self.direction[stuck] = np.where(at_start, 1, -1)
+
+    def _attack(self, hunter: np.ndarray, target: np.ndarray):
+        """ Each zombie bites one live entity in range, preferring the uninfected """
+        zx, zy = self.xy(hunter)
+        tx, ty = self.xy(target)
+        d = np.hypot(tx - zx, ty - zy)
+        in_range = d < config.ZOMBIE_ATTACK_RANGE
+        hunter, target, d = hunter[in_range], target[in_range], d[in_range]
+        if len(hunter) == 0:
+            return
+
+        # uninfected first, then by id so the pick does not depend on array order
+        order = np.lexsort((self.id[target], self.is_infected[target], hunter))
+        first = order[np.r_[True, hunter[order][1:] != hunter[order][:-1]]]
+        zombie, victim, d = hunter[first], target[first], d[first]
+
+        attack_modifier = np.where(self.direction[zombie] != self.direction[victim],
+                                   config.ZOMBIE_DIFFERENT_FACING_ATTACK_MODIFIER,
+                                   config.ZOMBIE_SAME_FACING_ATTACK_MODIFIER)
+        distance_factor = 1.0 - (d / (attack_modifier * config.ZOMBIE_ATTACK_RANGE))
+
+        ids = self.id[zombie]
+        bite = (self.rng.infection.uniform(ids, self.iteration, DRAW_BITE) <
+                config.ZOMBIE_INFECT_PROBABILITY * distance_factor)
+        self.infect(victim[bite])
+        np.add.at(self.infected_count, zombie[bite], 1)
+
+        destroy = (self.rng.infection.uniform(ids, self.iteration, DRAW_DESTROY) <
+                   config.ZOMBIE_DESTRUCTION_PROBABILITY * distance_factor)
+        self.is_destroyed[zombie[destroy]] = True
+
+    def has_survivors(self) -> bool:
+        n = self.count
+        return bool(np.any((self.kind[:n] == SURVIVOR) & ~self.is_ghost[:n]))
+
+    def population(self) -> Dict[str, int]:
+        """ Same result as Simulation.population """
+        n = self.count
+        owned = ~self.is_ghost[:n]
+        kind = self.kind[:n]
+        survivor = owned & (kind == SURVIVOR)
+        zombie = owned & (kind == ZOMBIE)
+        destroyed = self.is_destroyed[:n]
+        rising = self.init_delay[:n] > 0
+        masks = (survivor, survivor & self.is_infected[:n], survivor & self.is_panicked[:n],
+                 zombie & ~destroyed & ~rising, zombie & ~destroyed & rising, zombie & destroyed,
+                 owned & (kind == REMAINS))
+        population = {tally: int(np.count_nonzero(mask)) for tally, mask in zip(roads.TALLIES, masks)}
+        population['eligible'] = len(self.eligible_ids())
+        return population
+
+    def sector_grid(self, cell_size: float = None) -> stats.SectorGrid:
+        """ Same result as Simulation.sector_grid """
+        n = self.count
+        idx = np.flatnonzero((self.kind[:n] != REMAINS) & ~self.is_ghost[:n])
+        x, y = self.xy(idx)
+        survivor = self.kind[idx] == SURVIVOR
+        zombie = ~survivor
+        columns = np.stack([survivor,
+                            survivor & self.is_infected[idx],
+                            survivor & self.is_panicked[idx],
+                            zombie & ~self.is_destroyed[idx],
+                            zombie & self.is_destroyed[idx]])
+        return stats.sector_histogram(x, y, columns, cell_size)
+
+    def sector_counts(self) -> Dict[Tuple[int, int], Tuple[int, int, int, int, int]]:
+        """ Same result as Simulation.sector_counts """
+        return stats.counts_from_grid(self.sector_grid())
+
+    def tracks(self) -> trajectory.Tracks:
+        """ Same result as Simulation.tracks """
+        n = self.count
+        idx = np.flatnonzero((self.kind[:n] != REMAINS) & ~self.is_ghost[:n])
+        phase = np.where(self.kind[idx] == SURVIVOR, trajectory.SURVIVOR,
+                         np.where(self.is_destroyed[idx], trajectory.DESTROYED,
+                                  np.where(self.init_delay[idx] > 0, trajectory.CORPSE, trajectory.ZOMBIE)))
+        return trajectory.Tracks(self.id[idx], self.road[idx], self.pos[idx],
+                                 trajectory.pack_states(phase, self.is_infected[idx], self.is_panicked[idx],
+                                                        self.speed[idx]))
+
+    def draw(self, screen_data):
+        """ Draws the entities from their tracks, as Simulation.draw does """
+        from .drawing import draw_states
+        tracks = self.tracks()
+        x, y = self.network.point_at(tracks.road, tracks.pos)
+        draw_states(x, y, tracks.state, screen_data)
+
+    def eligible_ids(self) -> np.ndarray:
+        """ Ids of the uninfected survivors some zombie found on its last hunt """
+        hunter, target = self.nearby
+        eligible = target[(self.kind[target] == SURVIVOR) & ~self.is_infected[target]]
+        return np.unique(self.id[eligible])
+
+    def eligible_count(self) -> Tuple[int, float]:
+        """ Same result as Simulation.eligible_count """
+        n = self.count
+        zombies = (self.kind[:n] == ZOMBIE) & ~self.is_ghost[:n]
+        r0 = self.infected_count[:n][zombies].sum() / max(1, np.count_nonzero(zombies))
+        return len(self.eligible_ids()), float(r0)
@@ -0,0 +1,89 @@
+import collections
+import math
+
+import pygame
+
+from typing import Dict, List, Tuple
+
+from . import config
+from . import debug
+from . import drawing
+from . import generation
+from . import sectors
+
+
+class TileCache:
+    """
+    The static part of the map, the lots and the roads, drawn once per sector and zoom step
+    into off-screen tiles that every frame then just blits, so panning costs a blit per visible
+    sector rather than a line per visible road. The road network never changes once generated,
+    so tiles only go stale when the city or its lots are replaced, which is done by making a
+    new TileCache. Once the tiles take up more than max_bytes, the least recently used go.
+    """
+
+    def __init__(self, city: generation.City, lots: List[List[Tuple[float, float]]] = (), max_bytes: int = None):
+        self.city = city
+        self.lots = list(lots)
+        self.lot_colors = drawing.lot_colors(len(self.lots))
+        self.max_bytes = config.TILE_CACHE_BYTES if max_bytes is None else max_bytes
+        self.tiles: Dict[tuple, pygame.Surface] = collections.OrderedDict()
+        self.size = 0
+
+        # the lots overlapping each sector, by bounding box
+        self.lots_of: Dict[Tuple[int, int], List[int]] = {}
+        for i, poly in enumerate(self.lots):
+            x0, y0 = sectors.containing_sector((min(x for x, _ in poly), min(y for _, y in poly)))
+            x1, y1 = sectors.containing_sector((max(x for x, _ in poly), max(y for _, y in poly)))
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    self.lots_of.setdefault((x, y), []).append(i)
+
+    def draw(self, data: drawing.ScreenData) -> bool:
+        """
+        Blits the tiles of the visible sectors, drawing any that are missing
+        :return: False, having drawn nothing, when zoomed in so far that the tiles would be
+        bigger than TILE_MAX_SIZE; the few roads on screen are then cheaper to draw directly
+        """
+        if config.SECTOR_SIZE * data.zoom > config.TILE_MAX_SIZE:
+            return False
+        pan_x, pan_y = data.pan
+        blits = []
+        for sector in drawing.visible_sectors(data):
+            if sector in self.city.sectors or sector in self.lots_of:
+                tile, (x, y) = self.tile(sector, data)
+                blits.append((tile, (x + pan_x, y + pan_y)))
+        data.screen.blits(blits, doreturn=False)
+        return True
+
+    def tile(self, sector: Tuple[int, int], data: drawing.ScreenData) -> Tuple[pygame.Surface, Tuple[int, int]]:
+        """
+        Gets the tile of a sector at the current zoom step and road view
+        :return: (tile, where its top left goes on screen before panning)
+        """
+        origin = tile_origin(sector, data.zoom)
+        key = (sector, data.zoom_step, debug.SHOW_ROAD_VIEW)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile, origin
+
+        end = tile_origin((sector[0] + 1, sector[1] + 1), data.zoom)
+        tile = pygame.Surface((end[0] - origin[0], end[1] - origin[1]))
+        tile.set_colorkey((0, 0, 0))
+        tile_data = drawing.ScreenData(tile, (-origin[0], -origin[1]), data.zoom_step)
+        lots = self.lots_of.get(sector, [])
+        drawing.draw_lots([self.lots[i] for i in lots], [self.lot_colors[i] for i in lots], tile_data)
+        drawing.draw_all_roads(self.city.sectors.get(sector, []), tile_data)
+
+        self.tiles[key] = tile
+        self.size += tile.get_width() * tile.get_height() * tile.get_bytesize()
+        while self.size > self.max_bytes and len(self.tiles) > 1:
+            _, old = self.tiles.popitem(last=False)
+            self.size -= old.get_width() * old.get_height() * old.get_bytesize()
+        return tile, origin
+
+
+def tile_origin(sector: Tuple[int, int], zoom: float) -> Tuple[int, int]:
+    """ Where the top left of a sector is on screen before panning, rounded down to a whole pixel """
+    x, y = sectors.to_point(sector)
+    return math.floor(x * zoom), math.floor(y * zoom)
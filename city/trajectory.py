@@ -0,0 +1,235 @@
+"""
+Recordings of where every entity was on each tick, for replaying a run without simulating it.
+
+    recorder = trajectory.TrajectoryRecorder('outbreak.traj', trajectory.road_network(sim))
+    recorder.record(sim)  # between steps
+    recorder.close()
+
+    recording = trajectory.Trajectory('outbreak.traj')
+    frame = recording.frame(recording.frame_at(5000))
+
+A recording is a directory of columnar tables (see columnar.py), all read back as memory
+maps, so any frame can be decoded without reading the rest:
+    roads     the end points of every road, so a replay needs no city
+    frames    per recorded tick: the iteration, the first row and row count of its entities,
+              and the first row of its ids
+    entities  per entity per recorded tick, in id order: the road index, the distance along
+              the road as a fraction of its length in POSITION_SCALE steps, and a state byte
+              packed by pack_states
+    ids       the ids of a frame's entities as gaps from the previous id, only written when
+              they differ from the frame before, which they rarely do as a risen zombie keeps
+              the id of the survivor it was
+"""
+import collections
+import json
+import os
+
+import numpy as np
+
+from typing import Tuple
+
+from . import columnar
+from . import config
+from .network import Network
+
+VERSION = 1
+META_FILE = 'trajectory.json'
+
+# the positions are stored as a uint16 fraction of the road length
+POSITION_SCALE = 2 ** 16 - 1
+# frames and id blocks are written in chunks of this many rows
+INDEX_CHUNK_ROWS = 1024
+
+# the low two bits of a state byte: what the entity is
+SURVIVOR = 0
+ZOMBIE = 1
+CORPSE = 2
+DESTROYED = 3
+PHASE_MASK = 0b11
+INFECTED = 1 << 2
+PANICKED = 1 << 3
+# the high four bits: a survivor's speed between SURVIVOR_SPEED and SURVIVOR_PANIC_SPEED
+SPEED_SHIFT = 4
+SPEED_LEVELS = 15
+
+# the entities a replay shows, in no particular order: ids, road indices, distances along the
+# roads and states packed by pack_states. Every engine offers them from tracks()
+Tracks = collections.namedtuple("Tracks", ["id", "road", "pos", "state"])
+# one decoded frame; ids is None unless asked for
+Frame = collections.namedtuple("Frame", ["iteration", "id", "road", "pos", "state"])
+
+
+def pack_states(phase: np.ndarray, is_infected: np.ndarray, is_panicked: np.ndarray,
+                speed: np.ndarray) -> np.ndarray:
+    """
+    Packs entity states into a byte each
+    :param phase: SURVIVOR, ZOMBIE, CORPSE or DESTROYED
+    :param speed: Movement speed, only kept for survivors
+    """
+    boost = (np.asarray(speed) - config.SURVIVOR_SPEED) / (config.SURVIVOR_PANIC_SPEED - config.SURVIVOR_SPEED)
+    level = np.rint(np.clip(boost, 0, 1) * SPEED_LEVELS).astype(np.uint8)
+    survivor = phase == SURVIVOR
+    return (np.asarray(phase, dtype=np.uint8) |
+            np.where(survivor & is_infected, INFECTED, 0).astype(np.uint8) |
+            np.where(survivor & is_panicked, PANICKED, 0).astype(np.uint8) |
+            np.where(survivor, level << SPEED_SHIFT, 0).astype(np.uint8))
+
+
+def unpack_states(state: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Inverse of pack_states
+    :return: (phase, is_infected, is_panicked, speed factor as used by drawing.survivor_color)
+    """
+    level = (state >> SPEED_SHIFT) / SPEED_LEVELS
+    speed = config.SURVIVOR_SPEED + level * (config.SURVIVOR_PANIC_SPEED - config.SURVIVOR_SPEED)
+    return state & PHASE_MASK, (state & INFECTED) > 0, (state & PANICKED) > 0, speed / config.SURVIVOR_SPEED - 1
+
+
+def road_network(sim) -> Network:
+    """ The road network of a Simulation, Swarm or PartitionedSwarm """
+    network = getattr(sim, 'network', None)
+    return Network.from_roads(sim.city.roads) if network is None else network
+
+
+def road_dtype(road_count: int) -> np.dtype:
+    return np.dtype(np.uint16 if road_count <= 2 ** 16 else np.uint32)
+
+
+class TrajectoryRecorder:
+    """
+    Records a run's Tracks every `interval` ticks. Frames are encoded on the simulation thread
+    and written out by the columnar writer threads, so recording costs a tick little more than
+    the encoding.
+    """
+
+    def __init__(self, directory: str, network: Network, interval: int = None):
+        """
+        Starts a new recording, replacing any in the directory
+        :param network: The roads the recorded entities are on, see road_network
+        :param interval: Record every this many ticks, config.TRAJECTORY_INTERVAL by default
+        """
+        self.interval = config.TRAJECTORY_INTERVAL if interval is None else interval
+        self.length = network.length
+        self.road_dtype = road_dtype(len(network))
+        self.previous_ids = None
+        self.ids_start = 0
+
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, META_FILE), 'w') as meta_file:
+            json.dump({'version': VERSION, 'interval': self.interval, 'position_scale': POSITION_SCALE,
+                       'road_dtype': self.road_dtype.str}, meta_file)
+        road_table = columnar.ColumnWriter(os.path.join(directory, 'roads'),
+                                           [('x0', 'f8'), ('y0', 'f8'), ('x1', 'f8'), ('y1', 'f8')])
+        road_table.append(network.start[:, 0], network.start[:, 1], network.end[:, 0], network.end[:, 1])
+        road_table.close()
+
+        self.frames = columnar.ColumnWriter(os.path.join(directory, 'frames'),
+                                            [('iteration', 'i8'), ('start', 'i8'), ('count', 'i8'),
+                                             ('ids_start', 'i8')], INDEX_CHUNK_ROWS)
+        self.entities = columnar.ColumnWriter(os.path.join(directory, 'entities'),
+                                              [('road', self.road_dtype), ('pos', 'u2'), ('state', 'u1')])
+        self.ids = columnar.ColumnWriter(os.path.join(directory, 'ids'), [('gap', 'u4')], INDEX_CHUNK_ROWS)
+
+    def record(self, sim, force: bool = False):
+        """
+        Records the simulation's current tick if it falls on the interval
+        :param force: Record it whatever the iteration
+        """
+        if not force and sim.iteration % self.interval:
+            return
+        tracks = sim.tracks()
+        order = np.argsort(tracks.id, kind='stable')
+        ids = tracks.id[order]
+        road = tracks.road[order]
+
+        if self.previous_ids is None or not np.array_equal(ids, self.previous_ids):
+            self.ids_start = self.ids.rows
+            self.ids.append(np.diff(ids, prepend=0).astype(np.uint32))
+            self.previous_ids = ids
+
+        length = self.length[road]
+        fraction = np.divide(tracks.pos[order], length, out=np.zeros(len(road)), where=length > 0)
+        self.frames.append(np.array([sim.iteration]), np.array([self.entities.rows]), np.array([len(ids)]),
+                           np.array([self.ids_start]))
+        self.entities.append(road.astype(self.road_dtype),
+                             np.rint(np.clip(fraction, 0, 1) * POSITION_SCALE).astype(np.uint16),
+                             tracks.state[order])
+
+    def close(self):
+        self.entities.close()
+        self.ids.close()
+        self.frames.close()
+
+
+class Trajectory:
+    """ A recording made by TrajectoryRecorder, memory-mapped for random access to its frames """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+        if meta['version'] != VERSION:
+            raise ValueError(f"{directory} is a version {meta['version']} recording, expected {VERSION}")
+        self.interval = meta['interval']
+        self.position_scale = meta['position_scale']
+
+        roads = columnar.read_columns(os.path.join(directory, 'roads'), mmap=False)
+        self.start = np.stack([roads['x0'], roads['y0']], axis=1)
+        self.end = np.stack([roads['x1'], roads['y1']], axis=1)
+        delta = self.end - self.start
+        self.length = np.hypot(delta[:, 0], delta[:, 1])
+
+        self.entities = columnar.read_columns(os.path.join(directory, 'entities'))
+        self.gaps = columnar.read_columns(os.path.join(directory, 'ids'))['gap']
+        frames = columnar.read_columns(os.path.join(directory, 'frames'), mmap=False)
+        # a recording cut short mid-write ends at the last frame with all its rows on disk
+        entity_rows = len(self.entities['road'])
+        complete = ((frames['start'] + frames['count'] <= entity_rows) &
+                    (frames['ids_start'] + frames['count'] <= len(self.gaps)))
+        frame_count = len(complete) if complete.all() else int(np.argmin(complete))
+        self.iterations = frames['iteration'][:frame_count]
+        self.starts = frames['start'][:frame_count]
+        self.counts = frames['count'][:frame_count]
+        self.ids_starts = frames['ids_start'][:frame_count]
+
+    def __len__(self):
+        return len(self.iterations)
+
+    def frame_at(self, iteration: int) -> int:
+        """ The index of the last frame recorded at or before an iteration, or the first frame """
+        return max(0, int(np.searchsorted(self.iterations, iteration, side='right')) - 1)
+
+    def frame(self, index: int, visible_roads: np.ndarray = None, ids: bool = True) -> Frame:
+        """
+        Decodes a frame
+        :param visible_roads: A bool per road; only the entities on roads marked True are
+        decoded, the rest are only looked at for their road
+        :param ids: Decode the entity ids as well
+        :return: The frame, its positions as distances along the roads
+        """
+        start, count = int(self.starts[index]), int(self.counts[index])
+        road = np.asarray(self.entities['road'][start:start + count])
+        if visible_roads is None:
+            rows = None
+            pos = np.asarray(self.entities['pos'][start:start + count])
+            state = np.asarray(self.entities['state'][start:start + count])
+        else:
+            rows = np.flatnonzero(visible_roads[road])
+            road = road[rows]
+            pos = self.entities['pos'][start + rows]
+            state = self.entities['state'][start + rows]
+
+        entity_ids = None
+        if ids:
+            ids_start = int(self.ids_starts[index])
+            entity_ids = np.cumsum(self.gaps[ids_start:ids_start + count], dtype=np.int64)
+            if rows is not None:
+                entity_ids = entity_ids[rows]
+        return Frame(int(self.iterations[index]), entity_ids, road.astype(np.int64),
+                     pos * (self.length[road] / self.position_scale), state)
+
+    def xy(self, frame: Frame) -> Tuple[np.ndarray, np.ndarray]:
+        """ World coordinates of a frame's entities """
+        unit = (self.end[frame.road] - self.start[frame.road]) / np.where(self.length[frame.road] > 0,
+                                                                          self.length[frame.road], 1)[:, None]
+        xy = self.start[frame.road] + unit * frame.pos[:, None]
+        return xy[:, 0], xy[:, 1]
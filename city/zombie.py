@@ -1,52 +1,95 @@
 from . import config
-from .drawing import ScreenData, draw_zombie, draw_corpse, draw_label_world
 from .entity import Entity
 
-import random
+from typing import List, TYPE_CHECKING
+
+import numpy as np
 
 from .vectors import distance
 
+if TYPE_CHECKING:
+    from .drawing import ScreenData
+    from .rng import RandomStreams
+
 
 class Zombie(Entity):
 
-    def __init__(self, city, road=None, x=None, y=None, road_population_densities=None, init_delay=None):
-        super().__init__(city, road=road, x=x, y=y, road_population_densities=road_population_densities)
+    def __init__(self, city, rng, road=None, x=None, y=None, road_population_densities=None, init_delay=None,
+                 t=None):
+        # set before joining the road, which counts the zombie by them
+        self.is_destroyed = False
+        self.init_delay = 1
+        super().__init__(city, rng, road=road, x=x, y=y, road_population_densities=road_population_densities, t=t)
         if init_delay is None:
-            self.init_delay = random.randint(1, config.ZOMBIE_RAISE_DELAY)
+            self.init_delay = rng.spawn.randint(1, config.ZOMBIE_RAISE_DELAY)
         else:
             self.init_delay = max(init_delay, 1)
 
         self.is_dead = True
         self.is_infected = True
         self.is_panicked = False
-        self.is_destroyed = False
         self.just_destroyed = False
         self.infected_count = 0
+        self.prey = []
 
     def is_corpse(self):
         return self.init_delay > 0 or self.is_destroyed
 
     def destroy(self):
         self.nearby_entities = []
+        self.track_prey([])
         self.is_destroyed = True
         self.just_destroyed = True
+        self.road.entities.recount(self)
+
+    def tally(self) -> tuple:
+        if self.is_destroyed:
+            return 'corpses',
+        if self.init_delay > 0:
+            return 'rising',
+        return 'zombies',
+
+    def color(self):
+        from .drawing import zombie_color
+        return zombie_color(self.is_corpse(), self.is_destroyed)
 
-    def draw(self, screen_data: ScreenData):
+    def draw(self, screen_data: 'ScreenData'):
+        from .drawing import draw_zombie, draw_corpse
         if self.is_corpse():
-            draw_corpse(self.x, self.y, screen_data, self.is_destroyed)
+            draw_corpse(*self.position(), screen_data, self.is_destroyed)
         else:
-            draw_zombie(self.x, self.y, screen_data)
+            draw_zombie(*self.position(), screen_data)
         # draw_label_world((f"{self.id}", (self.x+10, self.y)), screen_data, 1)
         pass
 
     def move(self):
+        if self.hunt():
+            self.attack()
+
+    def hunt(self) -> bool:
+        """
+        The first half of a move: rise, or wander towards survivors noting who is nearby
+        :return: Whether the zombie is up and may attack this tick
+        """
         if self.is_destroyed:
-            return
+            return False
 
         if self.init_delay > 0:
             self.init_delay -= 1
-            return
+            if self.init_delay == 0:
+                self.road.entities.recount(self)
+            return False
+
+        self.stalk()
+        return True
+
+    def rise(self):
+        """ Gets up straight away, for when a schedule times the delay instead of hunt() """
+        self.init_delay = 0
+        self.road.entities.recount(self)
 
+    def stalk(self):
+        """ Wanders, speeding up and heading for crowds when survivors are nearby """
         speed = config.ZOMBIE_HUNT_SPEED if self.is_near_live_things else config.ZOMBIE_SPEED
         self.random_wander(speed=speed,
                            direction_change_probability=config.ZOMBIE_WANDER_DIRECTION_CHANGE_PROBABILITY,
@@ -54,16 +97,32 @@ class Zombie(Entity):
                            towards_higher_density=True,
                            target_entity_type='Survivor',
                            target_follow_probability=config.ZOMBIE_TARGET_FOLLOW_PROBABILITY)
-
+        self.track_prey([e for e in self.nearby_entities if not e.is_dead])
+
+    def track_prey(self, prey: list):
+        """
+        Replaces the live survivors found on the last hunt, keeping their hunted_by counts, and
+        so the eligible tally, up to date
+        """
+        # count the new prey first so that survivors found again never drop to zero in between
+        for survivor in prey:
+            survivor.hunted(1)
+        for survivor in self.prey:
+            survivor.hunted(-1)
+        self.prey = prey
+
+    def attack(self):
+        """ The second half of a move: bite someone in range, see resolve_attacks for the batched version """
         # check for survivors nearby
         victim_and_distance = None
         #e_vs = [e for e in self.road.entities if (not e.is_dead and
         #                                          distance((self.x, self.y), (e.x, e.y)) < config.ZOMBIE_ATTACK_RANGE)]
 
+        position = self.position()
         evs = [e for e in self.nearby_entities if (not e.is_dead and
-                                                   distance((self.x, self.y), (e.x, e.y)) < config.ZOMBIE_ATTACK_RANGE)]
+                                                   distance(position, e.position()) < config.ZOMBIE_ATTACK_RANGE)]
         for survivor in evs:
-            d = distance((self.x, self.y), (survivor.x, survivor.y))
+            d = distance(position, survivor.position())
             if d >= config.ZOMBIE_ATTACK_RANGE:
                 continue  # out of attack range
             victim_and_distance = (survivor, d)
@@ -83,10 +142,60 @@ class Zombie(Entity):
                            else config.ZOMBIE_SAME_FACING_ATTACK_MODIFIER)
         distance_factor = 1.0 - (victim_distance / (attack_modifier * config.ZOMBIE_ATTACK_RANGE))
 
-        r = random.random()
+        r = self.rng.infection.random()
         if r < config.ZOMBIE_INFECT_PROBABILITY * distance_factor:
             victim.infect()
             self.infected_count += 1
 
-        if random.random() < config.ZOMBIE_DESTRUCTION_PROBABILITY * distance_factor:
+        if self.rng.infection.random() < config.ZOMBIE_DESTRUCTION_PROBABILITY * distance_factor:
             self.destroy()
+
+
+def resolve_attacks(zombies: List[Zombie], rng: 'RandomStreams') -> int:
+    """
+    Zombie.attack for every zombie that hunted this tick at once. Each zombie picks the first
+    uninfected live entity in range in its nearby_entities order, or the last infected one if
+    there are none, and the bite and destruction draws are made in one block.
+    :return: The number of bites that infected
+    """
+    hunter, position, target, target_position, order = [], [], [], [], []
+    for k, zombie in enumerate(zombies):
+        zombie_position = zombie.position()
+        for j, e in enumerate(zombie.nearby_entities):
+            if not e.is_dead:
+                hunter.append(k)
+                position.append(zombie_position)
+                target.append(e)
+                target_position.append(e.position())
+                order.append(j)
+    if not target:
+        return 0
+
+    hunter = np.array(hunter)
+    d = np.hypot(*(np.array(target_position) - np.array(position)).T)
+    in_range = d < config.ZOMBIE_ATTACK_RANGE
+    infected = np.fromiter((e.is_infected for e in target), bool, len(target))
+    order = np.array(order)
+
+    # per zombie: in range first, then uninfected, then the earliest uninfected or latest infected
+    pick = np.lexsort((np.where(infected, -order, order), infected, ~in_range, hunter))
+    first = pick[np.r_[True, hunter[pick][1:] != hunter[pick][:-1]]]
+    first = first[in_range[first]]
+    if len(first) == 0:
+        return 0
+
+    facing = np.array([zombies[hunter[i]].direction != target[i].direction for i in first.tolist()])
+    attack_modifier = np.where(facing, config.ZOMBIE_DIFFERENT_FACING_ATTACK_MODIFIER,
+                               config.ZOMBIE_SAME_FACING_ATTACK_MODIFIER)
+    distance_factor = 1.0 - (d[first] / (attack_modifier * config.ZOMBIE_ATTACK_RANGE))
+    bite = rng.infection.array(len(first)) < config.ZOMBIE_INFECT_PROBABILITY * distance_factor
+    destroy = rng.infection.array(len(first)) < config.ZOMBIE_DESTRUCTION_PROBABILITY * distance_factor
+
+    for i, bites, destroyed in zip(first.tolist(), bite.tolist(), destroy.tolist()):
+        zombie = zombies[hunter[i]]
+        if bites:
+            target[i].infect()
+            zombie.infected_count += 1
+        if destroyed:
+            zombie.destroy()
+    return int(np.count_nonzero(bite))
@@ -1,11 +1,11 @@
 import pygame
-import city
+from city import city_generator
 
 # Simple pygame program
 
 if __name__ == '__main__':
 
-    city.city_generator.main()
+    city_generator.main()
     exit(0)
     # Import and initialize the pygame library
     pygame.init()
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from city import config
+from city import generation
+from city import partition
+from city import simulation
+from city import trajectory
+from city.network import Network
+from city.partition import PartitionedSwarm
+from city.rng import RandomStreams
+from city.swarm import Swarm, SURVIVOR, ZOMBIE
+
+SEED = 7
+# the ghost lag the engines used to part over showed within the first 250 ticks
+TICKS = 250
+
+
+@pytest.fixture(scope='module')
+def city():
+    return generation.generate(config.ROAD_SEED)
+
+
+def by_id(tracks):
+    order = np.argsort(tracks.id, kind='stable')
+    return [np.asarray(column)[order] for column in tracks]
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_partitioned_gives_the_same_tracks_as_arrays(city, workers):
+    densities = simulation.road_population_densities(city)
+    swarm = Swarm.from_city(city, densities, RandomStreams(SEED))
+    partitioned = PartitionedSwarm(Swarm.from_city(city, densities, RandomStreams(SEED)), workers)
+    try:
+        for _ in range(TICKS):
+            swarm.step()
+            partitioned.step()
+            for expected, actual in zip(by_id(swarm.tracks()), by_id(partitioned.tracks())):
+                np.testing.assert_array_equal(actual, expected)
+            assert partitioned.population() == swarm.population()
+            assert partitioned.eligible_count() == swarm.eligible_count()
+    finally:
+        partitioned.close()
+
+
+def test_partitioned_keeps_every_entity_once(city):
+    partitioned = PartitionedSwarm(Swarm.from_city(city, simulation.road_population_densities(city),
+                                                   RandomStreams(SEED)), 3)
+    try:
+        for _ in range(TICKS):
+            partitioned.step()
+            population = partitioned.population()
+            # every survivor that turns leaves its remains and a zombie with its id
+            assert population['survivors'] + population['remains'] == config.INIT_SURVIVORS + config.INIT_INFECTED
+            assert (population['zombies'] + population['rising'] + population['corpses'] ==
+                    config.INIT_ZOMBIES + population['remains'])
+
+            ids = np.concatenate([tracks.id for tracks in partitioned._ask('tracks')])
+            assert len(np.unique(ids)) == len(ids) == population['survivors'] + population['zombies'] + \
+                population['rising'] + population['corpses']
+    finally:
+        partitioned.close()
+
+
+def line_network(length: float) -> Network:
+    """ A single road along the x axis, with no links """
+    return Network(np.array([[0.0, 0.0]]), np.array([[length, 0.0]]), np.zeros(3, dtype=np.int64),
+                   np.zeros(0, dtype=np.int32), np.zeros(0, dtype=bool))
+
+
+def line_swarm(survivors, zombies) -> Swarm:
+    """ Survivors heading along the road and zombies that are up, at the given distances """
+    swarm = Swarm(line_network(3000), 4, RandomStreams(SEED))
+    survivor = swarm.add(SURVIVOR, np.zeros(len(survivors), dtype=np.int32), np.array(survivors, dtype=np.float64))
+    swarm.speed[survivor] = config.SURVIVOR_SPEED
+    swarm.direction[survivor] = 1
+    zombie = swarm.add(ZOMBIE, np.zeros(len(zombies), dtype=np.int32), np.array(zombies, dtype=np.float64))
+    swarm.is_dead[zombie] = True
+    swarm.is_infected[zombie] = True
+    return swarm
+
+
+def test_bite_on_a_ghost_that_migrates_to_a_third_block_reaches_its_new_owner(monkeypatch):
+    # a zombie in block 0 bites a block 1 survivor, which runs on into block 2 in the same tick
+    monkeypatch.setattr(config, 'ZOMBIE_INFECT_PROBABILITY', 10.0)
+    edges = np.array([-np.inf, 1000, 1000 + config.SURVIVOR_SPEED - 1, np.inf])
+    swarm = line_swarm([1000], [999])
+    survivor_id = swarm.id[0]
+    owner = partition.block_of(edges, swarm.xy(np.arange(swarm.count))[0])
+    workers = [partition._Worker(swarm.network, edges, block, swarm.take(np.flatnonzero(owner == block)),
+                                 RandomStreams(SEED), 0, np.zeros(0, dtype=np.int64))
+               for block in range(len(edges) - 1)]
+
+    def deliver(handovers):
+        for worker, delivery in zip(workers, partition.route(handovers, len(workers))):
+            worker.deliver(delivery)
+
+    # one tick as PartitionedSwarm.step runs it
+    deliver([worker.hand_over(migrate=True) for worker in workers])
+    deliver([worker.hunt() for worker in workers])
+    deliver([handover for handover, _ in (worker.flee() for worker in workers)])
+
+    for block, worker in enumerate(workers):
+        owned = worker.swarm
+        mine = np.flatnonzero((owned.id[:owned.count] == survivor_id) & ~owned.is_ghost[:owned.count])
+        if block == 2:
+            assert len(mine) and np.all(owned.is_infected[mine])
+        else:
+            assert len(mine) == 0
+
+
+def test_has_survivors_counts_a_survivor_crossing_a_block_edge():
+    # the zombie keeps block 1 from being empty, and is too far off and too long dead to matter
+    swarm = line_swarm([config.SECTOR_SIZE - 1], [2 * config.SECTOR_SIZE + 100])
+    swarm.init_delay[1] = 1000
+    partitioned = PartitionedSwarm(swarm, 2)
+    try:
+        assert partitioned.edges.tolist() == [-np.inf, config.SECTOR_SIZE, np.inf]
+        partitioned.step()
+        assert partitioned.has_survivors()
+        assert partitioned.population()['survivors'] == 1
+        phases = [tracks.state & trajectory.PHASE_MASK for tracks in partitioned._ask('tracks')]
+        assert [int(np.count_nonzero(phase == trajectory.SURVIVOR)) for phase in phases] == [0, 1]
+    finally:
+        partitioned.close()
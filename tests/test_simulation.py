@@ -0,0 +1,39 @@
+import pytest
+
+from city import config
+from city import generation
+from city import simulation
+from city import trajectory
+from city.zombie import Zombie
+
+
+@pytest.fixture
+def city():
+    return generation.generate(config.ROAD_SEED)
+
+
+def track_phase(sim, zombie):
+    tracks = sim.tracks()
+    return int(tracks.state[list(tracks.id).index(zombie.id)] & trajectory.PHASE_MASK)
+
+
+@pytest.mark.parametrize('init_delay', [1, 3])
+def test_scheduled_zombie_rises_on_the_tick_its_countdown_ends(city, init_delay):
+    sim = simulation.Simulation(city, simulation.road_population_densities(city))
+    zombie = Zombie(city, sim.rng, init_delay=init_delay)
+    zombie.id = -1
+    sim.add_zombie(zombie, sim.iteration)
+
+    # Zombie.hunt counts init_delay down once a tick from the first tick, and the zombie is up
+    # from the tick it reaches zero
+    for _ in range(init_delay - 1):
+        sim.step()
+        assert zombie.tally() == ('rising',)
+        assert zombie.is_corpse()
+        assert track_phase(sim, zombie) == trajectory.CORPSE
+
+    sim.step()
+    assert zombie.init_delay == 0
+    assert zombie.tally() == ('zombies',)
+    assert not zombie.is_corpse()
+    assert track_phase(sim, zombie) == trajectory.ZOMBIE
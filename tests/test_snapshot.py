@@ -0,0 +1,45 @@
+import struct
+
+import pandas as pd
+import pytest
+
+from city import config
+from city import headless
+from city import snapshot
+
+SAVE_AT = 60
+STOP_AT = 150
+
+
+@pytest.fixture(autouse=True)
+def no_city_cache(monkeypatch):
+    monkeypatch.setattr(config, 'CITY_CACHE_DIR', None)
+
+
+@pytest.mark.parametrize('engine', ['objects', 'arrays'])
+def test_restored_run_carries_on_as_the_uninterrupted_run(tmp_path, engine):
+    whole = tmp_path / 'whole'
+    first = tmp_path / 'first'
+    second = tmp_path / 'second'
+    for directory in (whole, first, second):
+        directory.mkdir()
+    path = str(tmp_path / 'run.snap')
+
+    expected = headless.run(engine=engine, max_ticks=STOP_AT, data_dir=str(whole), verbose=False)
+    headless.run(engine=engine, max_ticks=SAVE_AT, data_dir=str(first), verbose=False, save_snapshot=path)
+    assert snapshot.describe(path) == {'engine': engine, 'seed': config.ROAD_SEED, 'iteration': SAVE_AT}
+    restored = headless.run(max_ticks=STOP_AT, data_dir=str(second), verbose=False, restore=path)
+
+    pd.testing.assert_frame_equal(restored, expected.loc[SAVE_AT:])
+
+
+@pytest.mark.parametrize('offset, value', [(0, b'NOTASNAP'), (len(snapshot.MAGIC), struct.pack('<I', 99))])
+def test_read_rejects_a_wrong_magic_or_version(tmp_path, offset, value):
+    path = str(tmp_path / 'bad.snap')
+    snapshot.write(path, {'kind': 'test'}, {})
+    snapshot.read(path)
+    with open(path, 'r+b') as file:
+        file.seek(offset)
+        file.write(value)
+    with pytest.raises(ValueError):
+        snapshot.read(path)